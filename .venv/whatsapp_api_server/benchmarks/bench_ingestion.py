@@ -0,0 +1,72 @@
+"""
+Message ingestion throughput: per-row saves against the batching queue.
+
+Simulates concurrent senders, each posting messages from an event loop the
+way ChatConsumer does, and reports messages/sec for the 'direct' and
+'queued' CHAT_MESSAGE_INGESTION modes on a file-backed database.
+
+    python benchmarks/bench_ingestion.py --senders 50 --messages 40
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks._common import print_table, setup_django
+
+
+async def run_senders(chatroom, users, messages_per_sender):
+    from chats.service.services import MessageService
+
+    async def sender(user):
+        for i in range(messages_per_sender):
+            await MessageService().acreate_message(chatroom, user, f'{user.username} message {i}')
+
+    start = time.perf_counter()
+    await asyncio.gather(*(sender(user) for user in users))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--senders', type=int, default=50)
+    parser.add_argument('--messages', type=int, default=40, help='messages per sender')
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--flush-ms', type=int, default=10)
+    args = parser.parse_args()
+
+    teardown = setup_django(on_disk=True)
+    try:
+        from django.contrib.auth.models import User
+        from django.test.utils import override_settings
+        from chats.entity.models import ChatRoom, Message
+        from chats.service.ingestion import get_ingestion_queue
+
+        users = [User.objects.create_user(username=f'sender{i}', password='bench') for i in range(args.senders)]
+        total = args.senders * args.messages
+        rows = []
+        for mode in ('direct', 'queued'):
+            chatroom = ChatRoom.objects.create(name=f'room {mode}', max_members=args.senders)
+            with override_settings(
+                CHAT_MESSAGE_INGESTION=mode,
+                CHAT_INGESTION_BATCH_SIZE=args.batch_size,
+                CHAT_INGESTION_FLUSH_MS=args.flush_ms,
+            ):
+                elapsed = asyncio.run(run_senders(chatroom, users, args.messages))
+                if mode == 'queued':
+                    get_ingestion_queue().stop()
+
+            saved = Message.objects.filter(chatroom=chatroom).count()
+            assert saved == total, f'{mode}: expected {total} messages, saved {saved}'
+            rows.append((mode, total, f'{elapsed:.2f}', f'{total / elapsed:.0f}'))
+
+        print_table(('mode', 'messages', 'seconds', 'messages/sec'), rows)
+    finally:
+        teardown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+"""
+End-to-end load test of the REST and websocket paths.
+
+Drives the project's ASGI application in-process, with N concurrent
+simulated users each holding their own token:
+
+- history:   GET /api/messages/<room>/    (MessageListCreateView)
+- rooms:     GET /api/chatrooms/          (ChatRoomListCreateView)
+- send:      POST /api/messages/<room>/   (MessageListCreateView)
+- websocket: connect to /ws/chat/<room>/ and send messages over it
+             (ChatConsumer); latency is the round trip until the sender
+             sees its own message broadcast back.
+
+Reports client-side p50/p95/p99 and throughput per scenario, followed by
+the server-side metrics (latency and queries per view or consumer
+handler) that GET /api/metrics/ exposes.
+
+The database is file-backed: Django serves each ASGI request from its own
+thread, and an in-memory SQLite database cannot take concurrent writers.
+
+    python benchmarks/bench_load.py --users 20 --requests 50
+    python benchmarks/bench_load.py --scenarios history websocket --batch-window-ms 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks._common import print_table, setup_django, summarize, timer
+
+SCENARIOS = ['history', 'rooms', 'send', 'websocket']
+
+
+def seed(users, history):
+    from django.contrib.auth import get_user_model
+    from rest_framework.authtoken.models import Token
+    from chats.entity.models import ChatRoom, Message
+
+    chatroom = ChatRoom.objects.create(name='load test', max_members=users)
+    accounts = [get_user_model().objects.create_user(username=f'user{i}', password='password') for i in range(users)]
+    chatroom.members.add(*accounts)
+    ChatRoom.objects.bulk_create(ChatRoom(name=f'room {i}', max_members=10) for i in range(20))
+    Message.objects.bulk_create(
+        Message(chatroom=chatroom, sender=accounts[i % users], text=f'history message {i}') for i in range(history)
+    )
+    tokens = [Token.objects.create(user=user).key for user in accounts]
+    return chatroom, tokens
+
+
+async def http_request(application, method, path, token, body=None):
+    from channels.testing import HttpCommunicator
+
+    headers = [(b'authorization', f'Token {token}'.encode()), (b'host', b'testserver')]
+    if body is not None:
+        body = json.dumps(body).encode()
+        headers += [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+    communicator = HttpCommunicator(application, method, path, body=body or b'', headers=headers)
+    response = await communicator.get_response(timeout=30)
+    if response['status'] >= 400:
+        raise RuntimeError(f'{method} {path} returned {response["status"]}: {response["body"][:200]}')
+    return response
+
+
+async def run_http(application, tokens, requests, method, path, body=None):
+    samples = []
+
+    async def user(token):
+        for i in range(requests):
+            with timer(samples):
+                await http_request(application, method, path, token, body)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user(token) for token in tokens))
+    return samples, time.perf_counter() - start
+
+
+async def run_websocket(application, chatroom, tokens, requests):
+    from channels.testing import WebsocketCommunicator
+
+    connect_samples = []
+    samples = []
+
+    async def connect(token):
+        communicator = WebsocketCommunicator(application, f'/ws/chat/{chatroom.id}/?token={token}')
+        with timer(connect_samples):
+            connected, _ = await communicator.connect(timeout=30)
+        if not connected:
+            raise RuntimeError('websocket connection was rejected')
+        return communicator
+
+    async def user(index, communicator):
+        for i in range(requests):
+            text = f'user {index} message {i}'
+            with timer(samples):
+                await communicator.send_json_to({'type': 'chat.message', 'text': text})
+                # Other users' messages and presence events arrive in between.
+                while True:
+                    frame = await communicator.receive_json_from(timeout=30)
+                    if frame['type'] == 'chat.messages' and any(m['text'] == text for m in frame['messages']):
+                        break
+
+    start = time.perf_counter()
+    communicators = await asyncio.gather(*(connect(token) for token in tokens))
+    connect_elapsed = time.perf_counter() - start
+    start = time.perf_counter()
+    await asyncio.gather(*(user(index, communicator) for index, communicator in enumerate(communicators)))
+    elapsed = time.perf_counter() - start
+    for communicator in communicators:
+        await communicator.disconnect()
+    return (connect_samples, connect_elapsed), (samples, elapsed)
+
+
+async def run_scenarios(application, chatroom, tokens, args):
+    rows = []
+    for scenario in args.scenarios:
+        if scenario == 'history':
+            samples, elapsed = await run_http(application, tokens, args.requests, 'GET', f'/api/messages/{chatroom.id}/')
+        elif scenario == 'rooms':
+            samples, elapsed = await run_http(application, tokens, args.requests, 'GET', '/api/chatrooms/')
+        elif scenario == 'send':
+            samples, elapsed = await run_http(
+                application, tokens, args.requests, 'POST', f'/api/messages/{chatroom.id}/',
+                {'chatroom': chatroom.id, 'text': 'load test message'},
+            )
+        else:
+            (connect_samples, connect_elapsed), (samples, elapsed) = await run_websocket(
+                application, chatroom, tokens, args.requests
+            )
+            rows.append(row('websocket connect', len(tokens), connect_samples, connect_elapsed))
+        rows.append(row(scenario, len(tokens), samples, elapsed))
+    return rows
+
+
+def row(name, users, samples, elapsed):
+    summary = summarize(samples)
+    return [
+        name, users, len(samples),
+        f"{summary['p50']:.2f}", f"{summary['p95']:.2f}", f"{summary['p99']:.2f}",
+        f'{len(samples) / elapsed:.0f}',
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=20, help='concurrent simulated users')
+    parser.add_argument('--requests', type=int, default=50, help='requests (or messages) per user and scenario')
+    parser.add_argument('--history', type=int, default=5000, help='messages already in the chat room')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument('--batch-window-ms', type=int, default=None, help='override CHAT_BATCH_WINDOW_MS')
+    args = parser.parse_args()
+
+    teardown = setup_django(on_disk=True)
+    try:
+        from django.conf import settings
+        from chats.metrics import get_metrics
+        from chats.service.services import MetricsService
+        from whatsapp_api_server.asgi import application
+
+        if args.batch_window_ms is not None:
+            settings.CHAT_BATCH_WINDOW_MS = args.batch_window_ms
+
+        chatroom, tokens = seed(args.users, args.history)
+        MetricsService().reset_metrics()
+        rows = asyncio.run(run_scenarios(application, chatroom, tokens, args))
+
+        print(f'{args.users} users, {args.requests} requests each, {args.history} messages of history')
+        print_table(['scenario', 'users', 'requests', 'p50 ms', 'p95 ms', 'p99 ms', 'req/s'], rows)
+
+        print('\nserver side')
+        print_table(
+            ['handler', 'calls', 'p50 ms', 'p95 ms', 'p99 ms', 'queries', 'query ms'],
+            [
+                [
+                    name, metrics['latency_ms']['count'],
+                    f"{metrics['latency_ms']['p50']:.2f}", f"{metrics['latency_ms']['p95']:.2f}",
+                    f"{metrics['latency_ms']['p99']:.2f}", f"{metrics['queries']:.1f}", f"{metrics['query_time_ms']:.2f}",
+                ]
+                for name, metrics in get_metrics().snapshot().items()
+            ],
+        )
+    finally:
+        teardown()
+
+
+if __name__ == '__main__':
+    main()
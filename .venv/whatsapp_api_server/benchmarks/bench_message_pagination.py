@@ -0,0 +1,72 @@
+"""
+Message history page latency as a chat room grows.
+
+Seeds rooms of increasing size and times the latest page, a page from the
+middle of the history and the oldest page through MessageService. With
+keyset pagination on the (chatroom, timestamp, id) index the latency should
+stay flat regardless of room size.
+
+    python benchmarks/bench_message_pagination.py --sizes 1000 10000 100000
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks._common import print_table, setup_django, summarize, timer
+
+
+def seed_room(name, size, user):
+    from chats.entity.models import ChatRoom, Message
+
+    chatroom = ChatRoom.objects.create(name=name, max_members=10)
+    batch = []
+    for i in range(size):
+        batch.append(Message(chatroom=chatroom, sender=user, text=f'message {i}'))
+        if len(batch) == 5000:
+            Message.objects.bulk_create(batch)
+            batch = []
+    Message.objects.bulk_create(batch)
+    return chatroom
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    teardown = setup_django()
+    try:
+        from django.contrib.auth.models import User
+        from chats.entity.models import Message
+        from chats.service.services import MessageService
+
+        user = User.objects.create_user(username='bench', password='bench')
+        service = MessageService()
+        rows = []
+        for size in args.sizes:
+            chatroom = seed_room(f'room {size}', size, user)
+            ids = list(Message.objects.filter(chatroom=chatroom).order_by('id').values_list('id', flat=True))
+            cursors = {
+                'latest': None,
+                'middle': ids[len(ids) // 2],
+                'oldest': ids[min(args.page_size, len(ids) - 1)],
+            }
+            for label, before in cursors.items():
+                samples = []
+                for _ in range(args.repeat):
+                    with timer(samples):
+                        service.get_message_page(chatroom, before=before, limit=args.page_size)
+                stats = summarize(samples)
+                rows.append((size, label, f"{stats['p50']:.3f}", f"{stats['p95']:.3f}", f"{stats['p99']:.3f}"))
+
+        print_table(('room size', 'page', 'p50 ms', 'p95 ms', 'p99 ms'), rows)
+    finally:
+        teardown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Full-text message search on a synthetic corpus.
+
+Generates messages from a Zipf-distributed vocabulary spread over many chat
+rooms, lets the triggers maintain the search index while inserting, then
+times room-scoped searches for common, mid-frequency and rare words,
+multi-word queries and prefixes through MessageService.
+
+    python benchmarks/bench_message_search.py --messages 1000000 --rooms 100
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks._common import print_table, setup_django, summarize, timer
+
+
+def make_vocabulary(size, rng):
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(letters) for _ in range(rng.randint(3, 9))))
+    return sorted(words, key=lambda word: rng.random())
+
+
+def seed_corpus(messages, rooms, vocabulary, rng, user):
+    from django.db import connection, transaction
+    from django.utils import timezone
+    from chats.entity.models import ChatRoom
+
+    room_ids = [ChatRoom.objects.create(name=f'room {i}', max_members=10).id for i in range(rooms)]
+    weights = [1 / rank for rank in range(1, len(vocabulary) + 1)]
+    now = timezone.now()
+
+    batch_size = 50000
+    for start in range(0, messages, batch_size):
+        count = min(batch_size, messages - start)
+        words = rng.choices(vocabulary, weights=weights, k=count * 12)
+        rows = []
+        for i in range(count):
+            length = rng.randint(3, 12)
+            rows.append((rng.choice(room_ids), user.id, ' '.join(words[i * 12:i * 12 + length]), now))
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(
+                'INSERT INTO chats_message (chatroom_id, sender_id, text, timestamp) VALUES (%s, %s, %s, %s)',
+                rows,
+            )
+    return room_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=1000000)
+    parser.add_argument('--rooms', type=int, default=100)
+    parser.add_argument('--vocabulary', type=int, default=20000)
+    parser.add_argument('--page-size', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    teardown = setup_django(on_disk=True)
+    try:
+        from django.contrib.auth.models import User
+        from chats.entity.models import ChatRoom
+        from chats.repository import search
+        from chats.service.services import MessageService
+
+        rng = random.Random(args.seed)
+        vocabulary = make_vocabulary(args.vocabulary, rng)
+        user = User.objects.create_user(username='bench', password='bench')
+
+        start = time.perf_counter()
+        room_ids = seed_corpus(args.messages, args.rooms, vocabulary, rng, user)
+        search.optimize_search_index()
+        print(f'Inserted and indexed {args.messages} messages in {time.perf_counter() - start:.1f}s\n')
+
+        queries = {
+            'common word': vocabulary[0],
+            'mid word': vocabulary[len(vocabulary) // 100],
+            'rare word': vocabulary[-1],
+            'two words': f'{vocabulary[0]} {vocabulary[5]}',
+            'prefix': f'{vocabulary[10][:3]}*',
+        }
+        service = MessageService()
+        rows = []
+        for label, query in queries.items():
+            samples = []
+            for i in range(args.repeat):
+                chatroom = ChatRoom(pk=room_ids[i % len(room_ids)])
+                with timer(samples):
+                    service.search_messages(chatroom, query, limit=args.page_size)
+            stats = summarize(samples)
+            rows.append((label, query, f"{stats['p50']:.2f}", f"{stats['p95']:.2f}", f"{stats['p99']:.2f}"))
+
+        print_table(('query', 'text', 'p50 ms', 'p95 ms', 'p99 ms'), rows)
+    finally:
+        teardown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Message and chat room list serialization: DRF serializers against the
+fast row-based path.
+
+For each list size, times building the payload (queries included) and
+rendering it to JSON, the way MessageListCreateView and
+ChatRoomListCreateView do. The DRF rows use select_related/prefetch_related
+so the comparison is not dominated by N+1 queries.
+
+    python benchmarks/bench_serializers.py --sizes 50 200 1000
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks._common import print_table, setup_django, summarize, timer
+
+
+def seed(size, user):
+    from chats.entity.models import Attachment, ChatRoom, Message
+
+    chatroom = ChatRoom.objects.create(name=f'room {size}', max_members=10)
+    messages = Message.objects.bulk_create(
+        Message(chatroom=chatroom, sender=user, text=f'message number {i} with a little text') for i in range(size)
+    )
+    Attachment.objects.bulk_create(
+        Attachment(message=message, file=f'attachments/pictures/{message.id}.png', content_type='image/png')
+        for message in messages[::10]
+    )
+    return chatroom
+
+
+def measure(repeat, func):
+    samples = []
+    for _ in range(repeat):
+        with timer(samples):
+            func()
+    return summarize(samples)['p50']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[50, 200, 1000])
+    parser.add_argument('--rooms', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=30)
+    args = parser.parse_args()
+
+    teardown = setup_django()
+    try:
+        from django.contrib.auth.models import User
+        from rest_framework.renderers import JSONRenderer
+        from chats.controller.renderers import FastJSONRenderer, orjson
+        from chats.controller.serializers import ChatRoomSerializer, MessageSerializer
+        from chats.entity.models import ChatRoom, Message
+        from chats.repository.repository import MessageRepository
+
+        user = User.objects.create_user(username='bench', password='bench')
+        drf_renderer, fast_renderer = JSONRenderer(), FastJSONRenderer()
+        rows = []
+
+        for size in args.sizes:
+            chatroom = seed(size, user)
+            queryset = Message.objects.filter(chatroom=chatroom).order_by('-timestamp', '-id')
+
+            def drf():
+                return MessageSerializer(
+                    queryset.select_related('sender').prefetch_related('attachment_set'), many=True
+                ).data
+
+            def fast():
+                return MessageRepository().get_message_payloads(queryset)
+
+            assert drf() == fast(), 'fast path output differs from MessageSerializer'
+            payload = fast()
+            rows.append((f'{size} messages', 'DRF serializer', f'{measure(args.repeat, drf):.2f}'))
+            rows.append((f'{size} messages', 'row fast path', f'{measure(args.repeat, fast):.2f}'))
+            rows.append((f'{size} messages', 'JSONRenderer', f'{measure(args.repeat, lambda: drf_renderer.render(payload)):.2f}'))
+            rows.append((f'{size} messages', 'FastJSONRenderer', f'{measure(args.repeat, lambda: fast_renderer.render(payload)):.2f}'))
+
+        ChatRoom.objects.bulk_create(ChatRoom(name=f'extra room {i}', max_members=10) for i in range(args.rooms))
+        rooms = ChatRoom.objects.order_by('id')
+        total = rooms.count()
+        rows.append((f'{total} chat rooms', 'DRF serializer', f'{measure(args.repeat, lambda: ChatRoomSerializer(rooms, many=True).data):.2f}'))
+        rows.append((f'{total} chat rooms', 'row fast path', f"{measure(args.repeat, lambda: list(rooms.values('id', 'name', 'max_members'))):.2f}"))
+
+        print(f"orjson: {'installed' if orjson else 'not installed, FastJSONRenderer falls back to json'}\n")
+        print_table(('list', 'path', 'p50 ms'), rows)
+    finally:
+        teardown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+import copy
+import threading
+from urllib.parse import parse_qs
+from channels.db import database_sync_to_async
+from channels.auth import AuthMiddlewareStack
+from channels.middleware import BaseMiddleware
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from chats.repository.cache import build_chat_cache
+
+_token_cache = None
+_token_cache_lock = threading.Lock()
+
+
+def get_token_cache():
+    """
+    Get the process-wide token cache, configured from settings.CHAT_TOKEN_CACHE.
+    """
+    global _token_cache
+    with _token_cache_lock:
+        if _token_cache is None:
+            _token_cache = build_chat_cache(getattr(settings, 'CHAT_TOKEN_CACHE', {}))
+        return _token_cache
+
+
+def get_token(key):
+    """
+    Get a token with its user, reading through the token cache.
+
+    Returns:
+        Token: a copy of the cached token, or None if the key is unknown.
+    """
+    def load():
+        return Token.objects.select_related('user').filter(key=key).first()
+
+    token = get_token_cache().get_or_load('token', key, load)
+    if token is None:
+        # Unknown keys are not cached, or a token created later would be ignored.
+        get_token_cache().invalidate('token', key)
+        return None
+    # The cached instances are shared between requests; hand out copies.
+    token = copy.copy(token)
+    token.user = copy.copy(token.user)
+    return token
+
+
+def invalidate_token(key):
+    """
+    Drop a token from the cache, e.g. after logout or rotation.
+    """
+    get_token_cache().invalidate('token', key)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication that keeps recently used tokens and their users in
+    the token cache, so most requests authenticate without a query.
+
+    Cached tokens live for CHAT_TOKEN_CACHE's timeout at most; deleting a
+    token or saving its user drops it from the cache right away.
+    """
+    def authenticate_credentials(self, key):
+        token = get_token(key)
+        if token is None:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+        return (token.user, token)
+
+
+class TokenAuthMiddleware(BaseMiddleware):
+    """
+    Channels middleware that authenticates websockets by token.
+
+    The token is read from the `token` query string parameter or from an
+    `Authorization: Token <key>` header. Connections without one keep the
+    user set by the session middleware; an invalid token yields an
+    anonymous user.
+    """
+    async def __call__(self, scope, receive, send):
+        key = self.get_key(scope)
+        if key is not None:
+            scope = dict(scope)
+            scope['user'] = await self.get_user(key)
+        return await super().__call__(scope, receive, send)
+
+    def get_key(self, scope):
+        keys = parse_qs(scope.get('query_string', b'').decode()).get('token')
+        if keys:
+            return keys[0]
+        for name, value in scope.get('headers', []):
+            if name == b'authorization':
+                auth = value.decode().split()
+                if len(auth) == 2 and auth[0].lower() == TokenAuthentication.keyword.lower():
+                    return auth[1]
+        return None
+
+    @database_sync_to_async
+    def get_user(self, key):
+        token = get_token(key)
+        if token is None or not token.user.is_active:
+            return AnonymousUser()
+        return token.user
+
+
+def TokenAuthMiddlewareStack(inner):
+    """
+    Session and cookie authentication, overridden by a token when one is given.
+    """
+    return AuthMiddlewareStack(TokenAuthMiddleware(inner))
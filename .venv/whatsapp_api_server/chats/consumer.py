@@ -0,0 +1,190 @@
+import asyncio
+import json
+import time
+from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncWebsocketConsumer
+from django.conf import settings
+from chats.entity.models import ChatRoom
+from chats.metrics import ConsumerMetricsMixin
+from chats.presence import get_presence
+from chats.service.services import ChatService, MessageService
+
+class ChatConsumer(ConsumerMetricsMixin, AsyncWebsocketConsumer):
+    flush_task = None
+    chatroom = None
+    online = False
+
+    async def connect(self):
+        try:
+            chatroom_id = self.scope['url_route']['kwargs']['chatroom_id']
+        except KeyError:
+            return
+
+        self.chatroom_id = int(chatroom_id)
+
+        user = self.scope.get('user')
+        if user is None or not await database_sync_to_async(ChatService().is_member)(user, self.chatroom_id):
+            await self.close()
+            return
+
+        self.pending_messages = []
+        self.batch_window = getattr(settings, 'CHAT_BATCH_WINDOW_MS', 50) / 1000
+        self.batch_max_messages = getattr(settings, 'CHAT_BATCH_MAX_MESSAGES', 50)
+
+        chatroom_group_name = f"chat_{chatroom_id}"
+        await self.channel_layer.group_add(
+            chatroom_group_name,
+            self.channel_name
+        )
+
+        await self.accept()
+
+        self.online = True
+        await self.update_presence(get_presence().join)
+
+
+    async def disconnect(self, close_code):
+        if not self.online:
+            return
+        self.online = False
+
+        chatroom_id = self.scope['url_route']['kwargs']['chatroom_id']
+        chatroom_group_name = f"chat_{chatroom_id}"
+
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+
+        # Notify group about user disconnection once their last connection is gone
+        user_id = self.scope['user'].id
+        last_connection = await sync_to_async(get_presence().leave)(self.chatroom_id, self.channel_name)
+        if last_connection:
+            await self.send_presence_event('chat.user_left', user_id)
+
+        # Leave chatroom group
+        await self.channel_layer.group_discard(
+            chatroom_group_name,
+            self.channel_name
+        )
+
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            data = json.loads(text_data)
+        except (TypeError, ValueError):
+            await self.send_error('Frames should be JSON objects.')
+            return
+
+        if not isinstance(data, dict) or data.get('type') not in ('chat.message', 'heartbeat'):
+            await self.send_error('Unsupported message type.')
+            return
+
+        # Clients send a heartbeat well within CHAT_PRESENCE_TTL to stay
+        # online; sending messages counts as activity too.
+        if data['type'] == 'heartbeat' or time.monotonic() - self.presence_updated_at > get_presence().ttl / 4:
+            await self.update_presence(get_presence().heartbeat)
+        if data['type'] == 'heartbeat':
+            return
+
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.send_error('Authentication required to send messages.')
+            return
+
+        text = data.get('text')
+        if not text:
+            await self.send_error('Message text is required.')
+            return
+
+        # The message reaches this socket, like every other member's, through
+        # the chat room group once it has been persisted.
+        try:
+            await self.create_message(user, text)
+        except (ChatRoom.DoesNotExist, ValueError) as e:
+            await self.send_error(str(e))
+
+    async def create_message(self, user, text):
+        if self.chatroom is None:
+            self.chatroom = await database_sync_to_async(ChatService().get_chatroom)(self.chatroom_id)
+        return await MessageService().acreate_message(self.chatroom, user, text)
+
+    async def chat_message(self, event):
+        self.pending_messages.append(event['message'])
+
+        if self.batch_window <= 0 or len(self.pending_messages) >= self.batch_max_messages:
+            await self.flush_messages()
+        elif self.flush_task is None:
+            self.flush_task = asyncio.ensure_future(self.flush_messages_later())
+
+    async def flush_messages_later(self):
+        await asyncio.sleep(self.batch_window)
+        self.flush_task = None
+        await self.flush_messages()
+
+    async def flush_messages(self):
+        """
+        Send every pending message to the WebSocket as one batched frame.
+        """
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+            self.flush_task = None
+        if not self.pending_messages:
+            return
+
+        messages, self.pending_messages = self.pending_messages, []
+        await self.send(text_data=json.dumps({
+            'type': 'chat.messages',
+            'messages': messages,
+        }))
+
+    async def send_error(self, error):
+        await self.send(text_data=json.dumps({
+            'type': 'error',
+            'error': error,
+        }))
+
+    async def send_group_message(self, message):
+        chatroom_id = self.scope['url_route']['kwargs']['chatroom_id']
+        chatroom_group_name = f"chat_{chatroom_id}"
+
+        # Send message to chatroom group
+        await self.channel_layer.group_send(
+            chatroom_group_name,
+            message
+        )
+
+    async def update_presence(self, mark_online):
+        """
+        Announce the users whose connections expired, then mark this
+        connection online with join or heartbeat and announce the user if
+        they were offline.
+        """
+        user_id = self.scope['user'].id
+        for departed_user_id in await sync_to_async(get_presence().expire)(self.chatroom_id):
+            await self.send_presence_event('chat.user_left', departed_user_id)
+        if await sync_to_async(mark_online)(self.chatroom_id, self.channel_name, user_id):
+            await self.send_presence_event('chat.user_joined', user_id)
+        self.presence_updated_at = time.monotonic()
+
+    async def send_presence_event(self, event_type, user_id):
+        online_count = await sync_to_async(get_presence().count)(self.chatroom_id)
+        await self.send_group_message({
+            'type': event_type,
+            'user_id': user_id,
+            'online_count': online_count,
+        })
+
+    async def chat_user_joined(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'presence',
+            'event': 'joined',
+            'user_id': event['user_id'],
+            'online_count': event['online_count'],
+        }))
+
+    async def chat_user_left(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'presence',
+            'event': 'left',
+            'user_id': event['user_id'],
+            'online_count': event['online_count'],
+        }))
@@ -0,0 +1,454 @@
+import re
+from rest_framework import generics, status
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from .serializers import (
+    ChatRoomSerializer,
+    MessageSerializer,
+    AttachmentSerializer,
+    AttachmentUploadSerializer,
+    UserProfileSerializer,
+    LoginSerializer,
+    TokenSerializer
+)
+from .pagination import MessageCursorPagination, MessageSearchPagination
+from .renderers import FastJSONRenderer
+from chats.service.services import ChatService, MessageService, AttachmentService, MetricsService
+from django.contrib.auth.models import User
+from rest_framework.authtoken.models import Token
+from chats.entity.models import ChatRoom, Message, AttachmentUpload
+from drf_yasg.utils import swagger_auto_schema
+
+
+class ChatRoomListCreateView(generics.ListCreateAPIView):
+    """
+    API endpoint for creating and listing chat rooms.
+
+    - To create a new chat room, send a POST request with the required parameters.
+    - To list all chat rooms, send a GET request.
+
+    Parameters (POST):
+    - name: String, required, unique name for the chat room.
+    - max_members: Integer, optional, maximum members allowed in the chat room (default is 10).
+
+    Example (POST):
+    {
+        "name": "New Chat Room",
+        "max_members": 20
+    }
+
+    Example (GET):
+    GET /chatrooms/
+    """
+    serializer_class = ChatRoomSerializer
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+    
+    @swagger_auto_schema(responses={status.HTTP_200_OK: ChatRoomSerializer(many=True)})
+    def get_queryset(self):
+        """
+        Get the list of chat rooms.
+
+        Returns:
+            list: Chat room rows, already shaped like ChatRoomSerializer output.
+        """
+        
+        return ChatService().get_chatrooms()
+
+    def list(self, request, *args, **kwargs):
+        return Response(self.get_queryset())
+
+    @swagger_auto_schema(request_body=ChatRoomSerializer)
+    def create(self, request, *args, **kwargs):
+    
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        max_members = serializer.validated_data.get('max_members', 10)
+        if max_members < 2:
+            return Response({'error': 'Max members should be at least 2.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        chatroom = ChatService().create_chatroom(serializer.validated_data['name'], max_members)
+        ChatService().join_chatroom(request.user, chatroom)
+
+        headers = self.get_success_headers(serializer.data)
+        return Response(self.get_serializer(chatroom).data, status=status.HTTP_201_CREATED, headers=headers)
+
+
+class ChatRoomPresenceView(APIView):
+    """
+    API endpoint for the members of a chat room who are online right now.
+
+    Only members of the chat room may see who is online.
+
+    Example (GET):
+    GET /chatrooms/1/presence/
+    {
+        "chatroom": 1,
+        "online_count": 2,
+        "online": [3, 7]
+    }
+    """
+
+    def get(self, request, chatroom_id, *args, **kwargs):
+        if not ChatService().is_member(request.user, chatroom_id):
+            return Response({'error': 'You are not a member of this chat room.'}, status=status.HTTP_403_FORBIDDEN)
+
+        online = ChatService().get_online_members(chatroom_id)
+        return Response({
+            'chatroom': chatroom_id,
+            'online_count': len(online),
+            'online': online,
+        })
+
+
+class MessageListCreateView(generics.ListCreateAPIView):
+    """
+    API endpoint for creating and listing messages in a chat room.
+
+    - To create a new message, send a POST request with the required parameters.
+    - To list messages in a chat room, send a GET request. History is paginated
+      newest first; follow the `next` / `previous` links to page through it.
+
+    Parameters (POST):
+    - chatroom_id: Integer, required, ID of the chat room where the message will be posted.
+    - text: String, required, text content of the message.
+
+    Example (POST):
+    {
+        "chatroom_id": 1,
+        "text": "Hello, World!"
+    }
+
+    Parameters (GET):
+    - before: Integer, optional, return messages older than this message id.
+    - after: Integer, optional, return messages newer than this message id.
+    - page_size: Integer, optional, number of messages per page (default 50, max 200).
+
+    Example (GET):
+    GET /messages/1/?before=120&page_size=20
+    """
+    serializer_class = MessageSerializer
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+    cursor_pagination = MessageCursorPagination()
+    
+    @swagger_auto_schema(responses={status.HTTP_200_OK: MessageSerializer(many=True)})
+    def get_queryset(self):
+        chatroom_id = self.kwargs.get('chatroom_id')
+        try:
+            chatroom = ChatService().get_chatroom(chatroom_id)
+            messages = MessageService().get_messages(chatroom)
+            return messages
+        except ChatRoom.DoesNotExist:
+            return Message.objects.none()
+
+    def list(self, request, *args, **kwargs):
+        before, after, page_size = self.cursor_pagination.get_page_params(request)
+
+        chatroom_id = self.kwargs.get('chatroom_id')
+        try:
+            chatroom = ChatService().get_chatroom(chatroom_id)
+            messages, has_more = MessageService().get_message_page(chatroom, before=before, after=after, limit=page_size)
+        except ChatRoom.DoesNotExist:
+            messages, has_more = [], False
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Pages come back as ready-made MessageSerializer-shaped payloads.
+        return self.cursor_pagination.get_paginated_response(request, messages, has_more, before=before, after=after)
+    
+    @swagger_auto_schema(request_body=MessageSerializer)
+    def create(self, request, *args, **kwargs):
+        chatroom_id = request.data.get('chatroom')
+        text = request.data.get('text')
+
+        try:
+            chatroom = ChatService().get_chatroom(chatroom_id)
+        except ChatRoom.DoesNotExist:
+            return Response({'error': 'Chat room does not exist.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Get the authenticated user (assuming user is logged in)
+        sender = self.request.user 
+
+        try:
+            message = MessageService().create_message(chatroom, sender, text)
+            serializer = self.get_serializer(message)
+            headers = self.get_success_headers(serializer.data)
+            return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except TimeoutError:
+            return Response(
+                {'error': 'The message could not be saved in time, try again.'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+
+
+class MessageSearchView(generics.ListAPIView):
+    """
+    API endpoint for full-text search of the messages in a chat room.
+
+    Results are ranked best match first. Every word of the query must
+    appear in a message; end a word with '*' to match it as a prefix.
+    Only members of the chat room may search it.
+
+    Parameters (GET):
+    - q: String, required, words to search for.
+    - page: Integer, optional, 1-based page number.
+    - page_size: Integer, optional, number of results per page (default 20, max 100).
+
+    Example (GET):
+    GET /messages/1/search/?q=holiday+pho*
+    """
+    serializer_class = MessageSerializer
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+    search_pagination = MessageSearchPagination()
+
+    @swagger_auto_schema(responses={status.HTTP_200_OK: MessageSerializer(many=True)})
+    def list(self, request, *args, **kwargs):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'error': "Query parameter 'q' is required."}, status=status.HTTP_400_BAD_REQUEST)
+        page, page_size = self.search_pagination.get_page_params(request)
+
+        chatroom_id = self.kwargs.get('chatroom_id')
+        if not ChatService().is_member(request.user, chatroom_id):
+            return Response({'error': 'You are not a member of this chat room.'}, status=status.HTTP_403_FORBIDDEN)
+
+        try:
+            chatroom = ChatService().get_chatroom(chatroom_id)
+        except ChatRoom.DoesNotExist:
+            return Response({'error': 'Chat room does not exist.'}, status=status.HTTP_404_NOT_FOUND)
+
+        messages, has_more = MessageService().search_messages(chatroom, query, limit=page_size, offset=(page - 1) * page_size)
+        return self.search_pagination.get_paginated_response(request, messages, page, has_more)
+
+
+class MetricsView(APIView):
+    """
+    API endpoint for latency and database metrics, for staff users only.
+
+    - GET returns, per view and method ('MessageListCreateView GET') and per
+      consumer handler ('ChatConsumer.websocket_receive'), a latency
+      histogram with p50/p95/p99 in milliseconds, the error count, and the
+      average number and time of queries per call; plus cache hit ratios.
+    - DELETE resets every counter, e.g. before a load test.
+    """
+    permission_classes = [IsAdminUser]
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+
+    def get(self, request, *args, **kwargs):
+        return Response(MetricsService().get_metrics())
+
+    def delete(self, request, *args, **kwargs):
+        MetricsService().reset_metrics()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class LoginView(APIView):
+    """
+    API endpoint for user login.
+
+    - To log in, send a POST request with the username and password.
+
+    Parameters (POST):
+    - username: String, required, the username of the user.
+    - password: String, required, the password of the user.
+
+    Example (POST):
+    {
+        "username": "williams",
+        "password": "password"
+    }
+    """
+
+    @swagger_auto_schema(request_body=LoginSerializer, responses={status.HTTP_200_OK: TokenSerializer()})
+    def post(self, request, *args, **kwargs):
+        serializer = LoginSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        user = serializer.validated_data['user']
+        token, created = Token.objects.get_or_create(user=user)
+
+        return Response(TokenSerializer(token).data)
+
+
+class LogoutView(APIView):
+    """
+    API endpoint for user logout.
+
+    - To log out, send a POST request; the user's token is deleted, so it
+      stops authenticating both REST requests and websockets right away.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        Token.objects.filter(user=request.user).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class CreateUserView(generics.CreateAPIView):
+    """
+    API endpoint for creating a new user.
+
+    Parameters:
+        username (str): Username of the new user.
+        password (str): Password of the new user.
+
+    Returns:
+        Response: Created user details.
+    """
+
+    serializer_class = UserProfileSerializer
+
+    @swagger_auto_schema(request_body=MessageSerializer)
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        user = serializer.save()
+
+        headers = self.get_success_headers(serializer.data)
+        return Response(self.get_serializer(user).data, status=status.HTTP_201_CREATED, headers=headers)
+
+
+class AttachmentCreateView(generics.CreateAPIView):
+    """
+    API endpoint for creating attachments in a message.
+
+    - To create a new attachment, send a POST request with the required parameters.
+
+    Parameters (POST):
+    - message_id: Integer, required, ID of the message where the attachment will be added.
+    - file: File, required, the attachment file.
+
+    Example (POST):
+    {
+        "message_id": 1,
+        "file": <attach your file here>
+    }
+    """
+    serializer_class = AttachmentSerializer
+    
+    @swagger_auto_schema(request_body=AttachmentSerializer)
+    def create(self, request, *args, **kwargs):
+        message_id = request.data.get('message_id')
+        file = request.data.get('file')
+
+        # Retrieve the message
+        try:
+            message = Message.objects.get(pk=message_id)
+        except Message.DoesNotExist:
+            return Response({'error': 'Message does not exist.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if file is None:
+            return Response({'error': 'File is required.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Call AttachmentService to create attachment
+        attachment_service = AttachmentService()
+        attachment = attachment_service.create_attachment(message, file)
+
+        serializer = self.get_serializer(attachment)
+        headers = self.get_success_headers(serializer.data)
+        return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
+
+
+class AttachmentUploadCreateView(generics.CreateAPIView):
+    """
+    API endpoint for starting a resumable, chunked attachment upload.
+
+    - Send a POST request describing the file, then PUT its bytes to
+      /attachments/uploads/<id>/ in one or more chunks.
+
+    Parameters (POST):
+    - message: Integer, required, ID of the message the attachment belongs to.
+    - filename: String, required, original name of the file.
+    - size: Integer, required, total size of the file in bytes.
+
+    Example (POST):
+    {
+        "message": 1,
+        "filename": "holiday.mp4",
+        "size": 73400320
+    }
+    """
+    serializer_class = AttachmentUploadSerializer
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(request_body=AttachmentUploadSerializer)
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        if not AttachmentService().can_attach(request.user, serializer.validated_data['message']):
+            return Response({'error': 'You cannot attach files to this message.'}, status=status.HTTP_403_FORBIDDEN)
+
+        try:
+            upload = AttachmentService().start_upload(
+                serializer.validated_data['message'],
+                request.user,
+                serializer.validated_data['filename'],
+                serializer.validated_data['size'],
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(self.get_serializer(upload).data, status=status.HTTP_201_CREATED)
+
+
+class AttachmentUploadView(APIView):
+    """
+    API endpoint for sending and resuming the chunks of an upload.
+
+    - To send a chunk, PUT the raw bytes with a Content-Range header. Chunks
+      must be sent in order; the response carries the new offset.
+    - To resume an interrupted upload, GET it and continue from `offset`.
+
+    Example (PUT):
+    PUT /attachments/uploads/<id>/
+    Content-Range: bytes 0-1048575/73400320
+    <1 MiB of file data>
+
+    Once the last chunk arrives the response includes the `attachment` id;
+    thumbnails and metadata are filled in shortly after in the background.
+    Uploads left incomplete are removed after CHAT_UPLOAD_EXPIRY_HOURS by the
+    clean_attachment_uploads management command.
+    """
+    permission_classes = [IsAuthenticated]
+    content_range_pattern = re.compile(r'^bytes (\d+)-(\d+)/(\d+|\*)$')
+
+    @swagger_auto_schema(responses={status.HTTP_200_OK: AttachmentUploadSerializer()})
+    def get(self, request, upload_id, *args, **kwargs):
+        try:
+            upload = AttachmentUpload.objects.get(pk=upload_id, uploader=request.user)
+        except AttachmentUpload.DoesNotExist:
+            return Response({'error': 'Upload does not exist.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(AttachmentUploadSerializer(upload).data)
+
+    @swagger_auto_schema(responses={status.HTTP_200_OK: AttachmentUploadSerializer()})
+    def put(self, request, upload_id, *args, **kwargs):
+        try:
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            length = 0
+
+        content_range = request.META.get('HTTP_CONTENT_RANGE')
+        if content_range is None:
+            return Response({'error': 'Content-Range header is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        match = self.content_range_pattern.match(content_range)
+        if match is None or int(match.group(2)) - int(match.group(1)) + 1 != length:
+            return Response({'error': 'Content-Range does not match the request body.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            total = None if match.group(3) == '*' else int(match.group(3))
+            upload = AttachmentService().append_chunk(
+                upload_id, request.user, int(match.group(1)), length, request.stream, total=total
+            )
+        except AttachmentUpload.DoesNotExist:
+            return Response({'error': 'Upload does not exist.'}, status=status.HTTP_404_NOT_FOUND)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        response_status = status.HTTP_201_CREATED if upload.attachment_id else status.HTTP_200_OK
+        return Response(AttachmentUploadSerializer(upload).data, status=response_status)
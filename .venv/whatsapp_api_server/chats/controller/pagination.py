@@ -0,0 +1,124 @@
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class MessageCursorPagination:
+    """
+    Keyset pagination for chat room history.
+
+    Pages are addressed by message id rather than by offset:
+
+    - GET /messages/1/                  latest page
+    - GET /messages/1/?before=<id>      older messages than <id>
+    - GET /messages/1/?after=<id>       newer messages than <id>
+    - page_size: Integer, optional, bounded by max_page_size.
+
+    Every page is returned newest first.
+    """
+    page_size = 50
+    max_page_size = 200
+    page_size_query_param = 'page_size'
+
+    def get_page_params(self, request):
+        """
+        Parse the cursor and page size from the query string.
+
+        Returns:
+            tuple: (before, after, page_size)
+        """
+        before = self._get_int(request, 'before')
+        after = self._get_int(request, 'after')
+        if before is not None and after is not None:
+            raise ValidationError({'error': "Use either 'before' or 'after', not both."})
+
+        page_size = self._get_int(request, self.page_size_query_param)
+        if page_size is None:
+            page_size = self.page_size
+        elif page_size < 1:
+            raise ValidationError({'error': 'page_size should be at least 1.'})
+        return before, after, min(page_size, self.max_page_size)
+
+    def get_paginated_response(self, request, data, has_more, before=None, after=None):
+        """
+        Wrap a page of serialized messages with links to the neighbouring pages.
+        """
+        url = request.build_absolute_uri()
+        url = remove_query_param(remove_query_param(url, 'before'), 'after')
+
+        # Paging backwards we only know about older messages; paging forwards
+        # from a cursor, the cursor message itself is older than this page.
+        if after is None:
+            has_older, has_newer = has_more, before is not None
+        else:
+            has_older, has_newer = True, has_more
+
+        next_url = None
+        previous_url = None
+        if data:
+            if has_older:
+                next_url = replace_query_param(url, 'before', data[-1]['id'])
+            if has_newer:
+                previous_url = replace_query_param(url, 'after', data[0]['id'])
+
+        return Response({
+            'next': next_url,
+            'previous': previous_url,
+            'results': data,
+        })
+
+    def _get_int(self, request, name):
+        value = request.query_params.get(name)
+        if value in (None, ''):
+            return None
+        try:
+            return int(value)
+        except ValueError:
+            raise ValidationError({'error': f"'{name}' should be an integer."})
+
+
+class MessageSearchPagination:
+    """
+    Page-number pagination for ranked search results.
+
+    Ranked results have no stable cursor, so pages are numbered; the total
+    count is never computed, only whether another page exists.
+
+    - page: Integer, optional, 1-based page number.
+    - page_size: Integer, optional, bounded by max_page_size.
+    """
+    page_size = 20
+    max_page_size = 100
+    page_query_param = 'page'
+    page_size_query_param = 'page_size'
+
+    def get_page_params(self, request):
+        """
+        Parse the page number and page size from the query string.
+
+        Returns:
+            tuple: (page, page_size)
+        """
+        page = self._get_positive_int(request, self.page_query_param, 1)
+        page_size = self._get_positive_int(request, self.page_size_query_param, self.page_size)
+        return page, min(page_size, self.max_page_size)
+
+    def get_paginated_response(self, request, data, page, has_more):
+        url = request.build_absolute_uri()
+        return Response({
+            'next': replace_query_param(url, self.page_query_param, page + 1) if has_more else None,
+            'previous': replace_query_param(url, self.page_query_param, page - 1) if page > 1 else None,
+            'results': data,
+        })
+
+    def _get_positive_int(self, request, name, default):
+        value = request.query_params.get(name)
+        if value in (None, ''):
+            return default
+        try:
+            value = int(value)
+        except ValueError:
+            raise ValidationError({'error': f"'{name}' should be an integer."})
+        if value < 1:
+            raise ValidationError({'error': f"'{name}' should be at least 1."})
+        return value
@@ -0,0 +1,68 @@
+from rest_framework import serializers
+from django.contrib.auth.models import User
+from django.contrib.auth import authenticate
+from rest_framework.authtoken.models import Token
+from chats.entity.models import ChatRoom, Message, Attachment, AttachmentUpload
+
+class ChatRoomSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = ChatRoom
+        fields = ['id', 'name', 'max_members']
+
+class SenderSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ['id', 'username']
+
+class MessageSerializer(serializers.ModelSerializer):
+    # Message lists skip this serializer and build the same payload from
+    # plain rows (MessageRepository.get_message_payloads); keep them in step.
+    sender = SenderSerializer(read_only=True)
+    attachments = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Message
+        fields = ['id', 'chatroom', 'sender', 'text', 'timestamp', 'attachments']
+        read_only_fields = ['id', 'timestamp']
+
+    def get_attachments(self, obj):
+        # Sorted in Python so a prefetch_related('attachment_set') is honoured.
+        return [attachment.file.url for attachment in sorted(obj.attachment_set.all(), key=lambda attachment: attachment.pk)]
+
+class AttachmentSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Attachment
+        fields = '__all__'
+
+class AttachmentUploadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AttachmentUpload
+        fields = ['id', 'message', 'filename', 'size', 'offset', 'attachment']
+        read_only_fields = ['id', 'offset', 'attachment']
+
+class UserProfileSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ['username', 'password']
+        extra_kwargs = {'password': {'write_only': True}}
+
+    def create(self, validated_data):
+        user = User.objects.create_user(**validated_data)
+        return user
+
+class LoginSerializer(serializers.Serializer):
+    username = serializers.CharField()
+    password = serializers.CharField(write_only=True)
+
+    def validate(self, data):
+        user = authenticate(username=data['username'], password=data['password'])
+        if user and user.is_active:
+            data['user'] = user
+            return data
+        raise serializers.ValidationError("Incorrect credentials. Please try again.")
+
+class TokenSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Token
+        fields = ('key', )
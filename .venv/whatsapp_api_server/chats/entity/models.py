@@ -0,0 +1,86 @@
+import os
+import uuid
+from django.contrib.auth.models import User
+from django.db import models
+from django.utils import timezone
+
+def upload_to(instance, filename):
+    """
+    Dynamic upload_to function to organize attachments based on type.
+    """
+    ext = filename.split('.')[-1]
+    date_path = timezone.now().strftime('%Y/%m/%d')
+
+    # content_type is sniffed from the file's leading bytes before saving.
+    if instance.content_type.startswith('image/'):
+        return os.path.join('attachments/pictures', date_path, f"{timezone.now().timestamp()}.{ext}")
+    elif instance.content_type.startswith('video/'):
+        return os.path.join('attachments/videos', date_path, f"{timezone.now().timestamp()}.{ext}")
+    else:
+        # Handle other attachment types as needed
+        return os.path.join('attachments/other', date_path, f"{timezone.now().timestamp()}.{ext}")
+
+def thumbnail_upload_to(instance, filename):
+    """
+    upload_to function for attachment thumbnails.
+    """
+    date_path = timezone.now().strftime('%Y/%m/%d')
+    return os.path.join('attachments/thumbnails', date_path, filename)
+
+class ChatRoom(models.Model):
+    """
+    Model representing a chat room.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    max_members = models.PositiveIntegerField(default=10)
+    members = models.ManyToManyField(User, related_name='chat_rooms')
+
+class Message(models.Model):
+    """
+    Model representing a chat message.
+    """
+    chatroom = models.ForeignKey(ChatRoom, on_delete=models.CASCADE)
+    sender = models.ForeignKey(User, on_delete=models.CASCADE)
+    text = models.TextField()
+    timestamp = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination walks a room's history by (timestamp, id).
+            models.Index(fields=['chatroom', 'timestamp', 'id'], name='chats_msg_room_ts_id_idx'),
+        ]
+
+class Attachment(models.Model):
+    """
+    Model representing an attachment in a chat message.
+    """
+    PROCESSING_PENDING = 'pending'
+    PROCESSING_DONE = 'done'
+    PROCESSING_FAILED = 'failed'
+    PROCESSING_CHOICES = [
+        (PROCESSING_PENDING, 'Pending'),
+        (PROCESSING_DONE, 'Done'),
+        (PROCESSING_FAILED, 'Failed'),
+    ]
+
+    message = models.ForeignKey('Message', on_delete=models.CASCADE)
+    file = models.FileField(upload_to=upload_to)
+    content_type = models.CharField(max_length=100, default='application/octet-stream')
+    size = models.PositiveBigIntegerField(null=True, blank=True)
+    thumbnail = models.FileField(upload_to=thumbnail_upload_to, null=True, blank=True)
+    metadata = models.JSONField(default=dict, blank=True)
+    processing_status = models.CharField(max_length=10, choices=PROCESSING_CHOICES, default=PROCESSING_PENDING)
+
+class AttachmentUpload(models.Model):
+    """
+    Model representing a resumable, chunked attachment upload in progress.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    message = models.ForeignKey('Message', on_delete=models.CASCADE)
+    uploader = models.ForeignKey(User, on_delete=models.CASCADE)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    attachment = models.OneToOneField(Attachment, null=True, blank=True, on_delete=models.SET_NULL)
+    created_at = models.DateTimeField(auto_now_add=True)
+
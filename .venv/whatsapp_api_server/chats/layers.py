@@ -0,0 +1,228 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+
+
+class SQLiteConnections:
+    """
+    Per-thread SQLite connections to a file shared between processes.
+
+    Connections are never shared across threads or inherited across fork().
+    """
+    def __init__(self, path, schema):
+        self.path = str(path)
+        self.schema = schema
+        self.local = threading.local()
+
+    def get(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None or self.local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(self.schema)
+            self.local.connection = connection
+            self.local.pid = os.getpid()
+        return connection
+
+
+class SQLiteChannelLayer(BaseChannelLayer):
+    """
+    Channel layer shared by every process that points at the same SQLite file.
+
+    A stand-in for a Redis layer on a single machine or in tests: several
+    server processes can exchange group messages through it, so fan-out is
+    no longer limited to one process. Messages must be JSON-serializable.
+
+    Receivers poll the file with read-only queries, which never wait for
+    the write lock: every poll_interval seconds after a message, backing off
+    to max_poll_interval while the channel stays idle. Messages and group
+    memberships left behind by channels that went away are purged every
+    purge_interval seconds.
+
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'chats.layers.SQLiteChannelLayer',
+            'CONFIG': {'path': '/var/run/whatsapp/channels.sqlite3'},
+        },
+    }
+    """
+    extensions = ['groups', 'flush']
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS channel_messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            channel TEXT NOT NULL,
+            body TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS channel_messages_channel ON channel_messages (channel, id);
+        CREATE TABLE IF NOT EXISTS channel_groups (
+            group_name TEXT NOT NULL,
+            channel TEXT NOT NULL,
+            expires_at REAL NOT NULL,
+            PRIMARY KEY (group_name, channel)
+        );
+    """
+
+    def __init__(self, path, expiry=60, group_expiry=86400, capacity=100, channel_capacity=None,
+                 poll_interval=0.01, max_poll_interval=0.2, purge_interval=60, **kwargs):
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity, **kwargs)
+        self.channel_capacity = self.compile_capacities(channel_capacity or {})
+        self.group_expiry = group_expiry
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.purge_interval = purge_interval
+        self.purged_at = time.monotonic()
+        self.connections = SQLiteConnections(path, self.schema)
+
+    # Channel layer API
+
+    async def send(self, channel, message):
+        """
+        Send a message onto a channel.
+        """
+        assert isinstance(message, dict), 'message is not a dict'
+        assert self.valid_channel_name(channel), 'Channel name not valid'
+        await self._run(self._send, channel, json.dumps(message))
+
+    async def receive(self, channel):
+        """
+        Wait for the next message on a channel.
+        """
+        assert self.valid_channel_name(channel)
+        interval = self.poll_interval
+        while True:
+            body = await self._run(self._pop, channel)
+            if body is not None:
+                return json.loads(body)
+            await asyncio.sleep(interval)
+            interval = min(interval * 2, self.max_poll_interval)
+
+    async def new_channel(self, prefix='specific'):
+        """
+        Return a new channel name that is unique across processes.
+        """
+        return f'{prefix}.sqlite!{uuid.uuid4().hex}'
+
+    async def flush(self):
+        await self._run(self._flush)
+
+    async def close(self):
+        pass
+
+    # Groups extension
+
+    async def group_add(self, group, channel):
+        assert self.valid_group_name(group), 'Group name not valid'
+        assert self.valid_channel_name(channel), 'Channel name not valid'
+        await self._run(self._execute, (
+            'INSERT OR REPLACE INTO channel_groups (group_name, channel, expires_at) VALUES (?, ?, ?)'
+        ), (group, channel, time.time() + self.group_expiry))
+
+    async def group_discard(self, group, channel):
+        assert self.valid_group_name(group), 'Group name not valid'
+        assert self.valid_channel_name(channel), 'Channel name not valid'
+        await self._run(self._execute, (
+            'DELETE FROM channel_groups WHERE group_name = ? AND channel = ?'
+        ), (group, channel))
+
+    async def group_send(self, group, message):
+        """
+        Send a message to every channel in a group; full channels are skipped.
+        """
+        assert isinstance(message, dict), 'message is not a dict'
+        assert self.valid_group_name(group), 'Group name not valid'
+        await self._run(self._group_send, group, json.dumps(message))
+
+    # Storage, run in a worker thread
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    def _execute(self, sql, params):
+        self.connections.get().execute(sql, params)
+
+    def _send(self, channel, body):
+        connection = self.connections.get()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            self._purge_if_due(connection)
+            self._insert(connection, channel, body)
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def _group_send(self, group, body):
+        connection = self.connections.get()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            # Purge first: _insert clears a channel's expired messages, which
+            # are what marks it as dead.
+            self._purge_if_due(connection)
+            channels = connection.execute(
+                'SELECT channel FROM channel_groups WHERE group_name = ? AND expires_at > ?', (group, time.time())
+            ).fetchall()
+            for (channel,) in channels:
+                try:
+                    self._insert(connection, channel, body)
+                except ChannelFull:
+                    pass
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def _insert(self, connection, channel, body):
+        now = time.time()
+        connection.execute('DELETE FROM channel_messages WHERE channel = ? AND expires_at <= ?', (channel, now))
+        (queued,) = connection.execute('SELECT COUNT(*) FROM channel_messages WHERE channel = ?', (channel,)).fetchone()
+        if queued >= self.get_capacity(channel):
+            raise ChannelFull(channel)
+        connection.execute(
+            'INSERT INTO channel_messages (channel, body, expires_at) VALUES (?, ?, ?)',
+            (channel, body, now + self.expiry),
+        )
+
+    def _pop(self, channel):
+        connection = self.connections.get()
+        while True:
+            # Idle polls stay read-only, so they never contend for the write lock.
+            row = connection.execute(
+                'SELECT id FROM channel_messages WHERE channel = ? AND expires_at > ? ORDER BY id LIMIT 1',
+                (channel, time.time()),
+            ).fetchone()
+            if row is None:
+                return None
+            row = connection.execute('DELETE FROM channel_messages WHERE id = ? RETURNING body', row).fetchone()
+            if row is not None:
+                return row[0]
+
+    def _purge_if_due(self, connection):
+        if time.monotonic() - self.purged_at >= self.purge_interval:
+            self._purge(connection)
+            self.purged_at = time.monotonic()
+
+    def _purge(self, connection):
+        now = time.time()
+        # A live receiver drains its channel within a poll interval, so a
+        # message that sat there until it expired belongs to a dead channel;
+        # stop sending that channel group messages too.
+        connection.execute(
+            'DELETE FROM channel_groups WHERE expires_at <= ? OR channel IN '
+            '(SELECT channel FROM channel_messages WHERE expires_at <= ?)',
+            (now, now),
+        )
+        connection.execute('DELETE FROM channel_messages WHERE expires_at <= ?', (now,))
+
+    def _flush(self):
+        connection = self.connections.get()
+        connection.execute('DELETE FROM channel_messages')
+        connection.execute('DELETE FROM channel_groups')
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from chats.service.services import AttachmentService
+
+
+class Command(BaseCommand):
+    help = 'Delete chunked attachment uploads abandoned for longer than CHAT_UPLOAD_EXPIRY_HOURS.'
+
+    def handle(self, *args, **options):
+        removed = AttachmentService().clean_abandoned_uploads()
+        self.stdout.write(self.style.SUCCESS(f'Removed {removed} abandoned upload file(s).'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from chats.repository import search
+
+
+class Command(BaseCommand):
+    help = 'Recreate the full-text message search index and re-index every message.'
+
+    def handle(self, *args, **options):
+        if not search.is_supported(connection):
+            raise CommandError(f'Full-text search is not available on {connection.vendor}.')
+
+        with transaction.atomic():
+            search.drop_search_index(connection)
+            search.create_search_index(connection)
+        search.optimize_search_index(connection)
+        self.stdout.write(self.style.SUCCESS('Message search index rebuilt.'))
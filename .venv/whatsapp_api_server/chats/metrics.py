@@ -0,0 +1,210 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from channels.consumer import get_handler_name
+from channels.exceptions import StopConsumer
+
+# Upper bounds of the latency buckets, in milliseconds; slower samples fall
+# into a final overflow bucket.
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+_current_queries = ContextVar('chats_metrics_queries', default=None)
+
+
+class LatencyHistogram:
+    """
+    Fixed-bucket latency histogram.
+
+    Observing a sample is a bisect and an increment, so memory does not grow
+    with traffic; percentiles are interpolated within their bucket.
+    """
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, pct):
+        if not self.count:
+            return 0.0
+        rank = pct / 100 * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / count, self.max)
+            seen += count
+        return self.max
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+            'max': self.max,
+            'buckets': {str(bound): count for bound, count in zip(self.buckets + ('+Inf',), self.counts)},
+        }
+
+
+class QueryStats:
+    """
+    Number and total time of the database queries run on behalf of one
+    request or consumer handler.
+    """
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+
+
+def track_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper that adds each query to the current QueryStats.
+
+    Installed on every connection; a no-op outside of measure().
+    """
+    stats = _current_queries.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.count += 1
+        stats.time += (time.perf_counter() - start) * 1000
+
+
+def install_query_tracking(connection, **kwargs):
+    """
+    Add track_query to a database connection (a connection_created receiver).
+    """
+    if track_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(track_query)
+
+
+class MetricsRegistry:
+    """
+    Latency histograms and query totals, kept per view or consumer handler.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}
+
+    def record(self, name, elapsed, queries, error=False):
+        with self.lock:
+            entry = self.entries.get(name)
+            if entry is None:
+                entry = self.entries[name] = {
+                    'latency': LatencyHistogram(),
+                    'errors': 0,
+                    'queries': 0,
+                    'query_time': 0.0,
+                }
+            entry['latency'].observe(elapsed)
+            entry['errors'] += error
+            entry['queries'] += queries.count
+            entry['query_time'] += queries.time
+
+    def snapshot(self):
+        """
+        Get the metrics as a dict of name -> latency summary and query totals.
+
+        Times are in milliseconds; queries and query_time are per call averages.
+        """
+        with self.lock:
+            result = {}
+            for name in sorted(self.entries):
+                entry = self.entries[name]
+                calls = entry['latency'].count
+                result[name] = {
+                    'latency_ms': entry['latency'].snapshot(),
+                    'errors': entry['errors'],
+                    'queries': entry['queries'] / calls,
+                    'query_time_ms': entry['query_time'] / calls,
+                }
+            return result
+
+    def reset(self):
+        with self.lock:
+            self.entries.clear()
+
+    @contextmanager
+    def measure(self, name, expected=()):
+        """
+        Time the block and count the queries it runs, including those run
+        from sync_to_async threads, under the given name.
+
+        Exceptions other than the expected ones are counted as errors.
+        """
+        queries = QueryStats()
+        token = _current_queries.set(queries)
+        start = time.perf_counter()
+        error = False
+        try:
+            yield
+        except expected:
+            raise
+        except BaseException:
+            error = True
+            raise
+        finally:
+            _current_queries.reset(token)
+            self.record(name, (time.perf_counter() - start) * 1000, queries, error)
+
+
+_metrics = MetricsRegistry()
+
+
+def get_metrics():
+    """
+    Get the process-wide metrics registry.
+    """
+    return _metrics
+
+
+class RequestMetricsMiddleware:
+    """
+    Record the latency and queries of every request, per view and method,
+    e.g. 'MessageListCreateView GET'. Requests that resolve to no view are
+    not recorded; responses with a 5xx status count as errors.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = QueryStats()
+        token = _current_queries.set(queries)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_queries.reset(token)
+        elapsed = (time.perf_counter() - start) * 1000
+
+        match = getattr(request, 'resolver_match', None)
+        if match is not None:
+            view = getattr(match.func, 'view_class', match.func)
+            get_metrics().record(f'{view.__name__} {request.method}', elapsed, queries, response.status_code >= 500)
+        return response
+
+
+class ConsumerMetricsMixin:
+    """
+    Record the latency and queries of every message a consumer handles, per
+    handler, e.g. 'ChatConsumer.websocket_receive'.
+    """
+    async def dispatch(self, message):
+        name = f'{type(self).__name__}.{get_handler_name(message)}'
+        with get_metrics().measure(name, expected=(StopConsumer,)):
+            await super().dispatch(message)
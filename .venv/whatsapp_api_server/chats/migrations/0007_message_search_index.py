@@ -0,0 +1,21 @@
+from django.db import migrations
+from chats.repository import search
+
+
+def create_search_index(apps, schema_editor):
+    search.create_search_index(schema_editor.connection)
+
+
+def drop_search_index(apps, schema_editor):
+    search.drop_search_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0006_chunked_attachment_uploads'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,20 @@
+from django.db import migrations
+from chats.repository import search
+
+
+def recreate_search_index(apps, schema_editor):
+    # The index of 0007 read its content through a view on chats_message,
+    # which made any later migration that rebuilds that table fail.
+    search.drop_search_index(schema_editor.connection)
+    search.create_search_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0007_message_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(recreate_search_index, migrations.RunPython.noop),
+    ]
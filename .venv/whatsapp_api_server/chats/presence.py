@@ -0,0 +1,339 @@
+import threading
+import time
+from collections import Counter, OrderedDict
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+from chats.layers import SQLiteConnections
+
+try:
+    import redis
+except ImportError:  # redis is optional; only RedisPresence needs it.
+    redis = None
+
+
+class LocalPresence:
+    """
+    Presence tracker for a single process.
+
+    Each websocket connection is tracked by channel name with an expiry that
+    heartbeats push forward. Per-room counters are kept up to date on every
+    change, so counting online users is a dict lookup rather than a sweep.
+    Users whose last connection expired are kept aside until expire()
+    reports them, so every departure is announced exactly once.
+    """
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        # room -> OrderedDict(channel -> (user_id, expires_at)), oldest heartbeat first
+        self.connections = {}
+        # room -> Counter(user_id -> open connections)
+        self.users = {}
+        # room -> ids of users who expired and have not been reported yet
+        self.departed = {}
+
+    def join(self, chatroom_id, channel_name, user_id):
+        """
+        Mark a connection as online.
+
+        Returns:
+            bool: True if this is the user's first connection to the room.
+        """
+        with self.lock:
+            self._expire(chatroom_id)
+            connections = self.connections.setdefault(chatroom_id, OrderedDict())
+            users = self.users.setdefault(chatroom_id, Counter())
+            new_connection = channel_name not in connections
+            if new_connection:
+                users[user_id] += 1
+            connections[channel_name] = (user_id, time.monotonic() + self.ttl)
+            connections.move_to_end(channel_name)
+            if not new_connection or users[user_id] > 1:
+                return False
+            departed = self.departed.get(chatroom_id, [])
+            if user_id in departed:
+                # Back before anyone announced the departure: announce neither.
+                departed.remove(user_id)
+                return False
+            return True
+
+    def heartbeat(self, chatroom_id, channel_name, user_id):
+        """
+        Keep a connection online for another ttl seconds.
+
+        A connection that already expired is brought back, exactly as join
+        would.
+
+        Returns:
+            bool: True if the user was offline until now.
+        """
+        return self.join(chatroom_id, channel_name, user_id)
+
+    def expire(self, chatroom_id):
+        """
+        Drop the connections whose ttl ran out.
+
+        Returns:
+            list: ids of the users who went offline, each reported once.
+        """
+        with self.lock:
+            self._expire(chatroom_id)
+            return self.departed.pop(chatroom_id, [])
+
+    def leave(self, chatroom_id, channel_name):
+        """
+        Mark a connection as gone.
+
+        Returns:
+            bool: True if the user has no other connection to the room.
+        """
+        with self.lock:
+            entry = self.connections.get(chatroom_id, {}).pop(channel_name, None)
+            if entry is None:
+                return False
+            return self._release(chatroom_id, entry[0])
+
+    def online(self, chatroom_id):
+        """
+        Get the ids of the users online in a room.
+        """
+        with self.lock:
+            self._expire(chatroom_id)
+            return sorted(self.users.get(chatroom_id, ()))
+
+    def count(self, chatroom_id):
+        """
+        Get the number of users online in a room.
+        """
+        with self.lock:
+            self._expire(chatroom_id)
+            return len(self.users.get(chatroom_id, ()))
+
+    def _expire(self, chatroom_id):
+        # Entries are ordered by expiry, so only the expired ones are visited.
+        connections = self.connections.get(chatroom_id)
+        now = time.monotonic()
+        while connections:
+            channel_name, (user_id, expires_at) = next(iter(connections.items()))
+            if expires_at > now:
+                break
+            del connections[channel_name]
+            if self._release(chatroom_id, user_id):
+                self.departed.setdefault(chatroom_id, []).append(user_id)
+
+    def _release(self, chatroom_id, user_id):
+        users = self.users[chatroom_id]
+        users[user_id] -= 1
+        if users[user_id] > 0:
+            return False
+        del users[user_id]
+        return True
+
+
+class SQLitePresence:
+    """
+    Presence tracker shared by every process that points at the same SQLite
+    file, for use alongside SQLiteChannelLayer.
+
+    Reads are indexed lookups of one room's live connections. Expired rows
+    stay until expire() deletes and reports them.
+    """
+    schema = """
+        CREATE TABLE IF NOT EXISTS presence (
+            chatroom_id INTEGER NOT NULL,
+            channel TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            expires_at REAL NOT NULL,
+            PRIMARY KEY (chatroom_id, channel)
+        );
+        CREATE INDEX IF NOT EXISTS presence_room_user ON presence (chatroom_id, user_id, expires_at);
+    """
+
+    def __init__(self, path, ttl=60):
+        self.ttl = ttl
+        self.connections = SQLiteConnections(path, self.schema)
+
+    def join(self, chatroom_id, channel_name, user_id):
+        connection = self.connections.get()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            first = not self._has_connections(connection, chatroom_id, user_id)
+            connection.execute(
+                'INSERT OR REPLACE INTO presence (chatroom_id, channel, user_id, expires_at) VALUES (?, ?, ?, ?)',
+                (chatroom_id, channel_name, user_id, time.time() + self.ttl),
+            )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return first
+
+    def heartbeat(self, chatroom_id, channel_name, user_id):
+        return self.join(chatroom_id, channel_name, user_id)
+
+    def expire(self, chatroom_id):
+        connection = self.connections.get()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            rows = connection.execute(
+                'DELETE FROM presence WHERE chatroom_id = ? AND expires_at <= ? RETURNING user_id',
+                (chatroom_id, time.time()),
+            ).fetchall()
+            departed = sorted(
+                user_id for user_id in {row[0] for row in rows}
+                if not self._has_connections(connection, chatroom_id, user_id)
+            )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return departed
+
+    def leave(self, chatroom_id, channel_name):
+        connection = self.connections.get()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                'DELETE FROM presence WHERE chatroom_id = ? AND channel = ? RETURNING user_id',
+                (chatroom_id, channel_name),
+            ).fetchone()
+            last = row is not None and not self._has_connections(connection, chatroom_id, row[0])
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return last
+
+    def online(self, chatroom_id):
+        rows = self.connections.get().execute(
+            'SELECT DISTINCT user_id FROM presence WHERE chatroom_id = ? AND expires_at > ? ORDER BY user_id',
+            (chatroom_id, time.time()),
+        ).fetchall()
+        return [user_id for (user_id,) in rows]
+
+    def count(self, chatroom_id):
+        (count,) = self.connections.get().execute(
+            'SELECT COUNT(DISTINCT user_id) FROM presence WHERE chatroom_id = ? AND expires_at > ?',
+            (chatroom_id, time.time()),
+        ).fetchone()
+        return count
+
+    def _has_connections(self, connection, chatroom_id, user_id):
+        # Expired rows count until expire() reports them, as in LocalPresence.
+        return connection.execute(
+            'SELECT 1 FROM presence WHERE chatroom_id = ? AND user_id = ? LIMIT 1',
+            (chatroom_id, user_id),
+        ).fetchone() is not None
+
+
+class RedisPresence:
+    """
+    Presence tracker shared by every node that points at the same Redis, for
+    use alongside channels_redis.
+
+    Each room keeps a sorted set of its connections scored by expiry, the
+    owner of each connection and the number of connections per user. Every
+    change runs as one Lua script, so nodes never see half an update.
+    Expired connections count until expire() removes and reports them, as
+    in SQLitePresence.
+    """
+    join_script = """
+        local added = redis.call('ZADD', KEYS[1], ARGV[3], ARGV[1])
+        redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+        if added == 1 and redis.call('HINCRBY', KEYS[3], ARGV[2], 1) == 1 then
+            return 1
+        end
+        return 0
+    """
+    leave_script = """
+        local user_id = redis.call('HGET', KEYS[2], ARGV[1])
+        if not user_id then
+            return 0
+        end
+        redis.call('ZREM', KEYS[1], ARGV[1])
+        redis.call('HDEL', KEYS[2], ARGV[1])
+        if redis.call('HINCRBY', KEYS[3], user_id, -1) <= 0 then
+            redis.call('HDEL', KEYS[3], user_id)
+            return 1
+        end
+        return 0
+    """
+    expire_script = """
+        local departed = {}
+        for _, channel in ipairs(redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])) do
+            local user_id = redis.call('HGET', KEYS[2], channel)
+            redis.call('ZREM', KEYS[1], channel)
+            redis.call('HDEL', KEYS[2], channel)
+            if user_id and redis.call('HINCRBY', KEYS[3], user_id, -1) <= 0 then
+                redis.call('HDEL', KEYS[3], user_id)
+                table.insert(departed, user_id)
+            end
+        end
+        return departed
+    """
+    online_script = """
+        local user_ids = {}
+        for _, channel in ipairs(redis.call('ZRANGEBYSCORE', KEYS[1], '(' .. ARGV[1], '+inf')) do
+            local user_id = redis.call('HGET', KEYS[2], channel)
+            if user_id then
+                user_ids[user_id] = true
+            end
+        end
+        local result = {}
+        for user_id in pairs(user_ids) do
+            table.insert(result, user_id)
+        end
+        return result
+    """
+
+    def __init__(self, url, ttl=60, prefix='chats:presence'):
+        if redis is None:
+            raise ImproperlyConfigured('RedisPresence requires the redis package.')
+        self.ttl = ttl
+        self.prefix = prefix
+        self.client = redis.Redis.from_url(url)
+        self._join = self.client.register_script(self.join_script)
+        self._leave = self.client.register_script(self.leave_script)
+        self._expire = self.client.register_script(self.expire_script)
+        self._online = self.client.register_script(self.online_script)
+
+    def join(self, chatroom_id, channel_name, user_id):
+        return bool(self._join(
+            keys=self.get_keys(chatroom_id), args=[channel_name, user_id, time.time() + self.ttl],
+        ))
+
+    def heartbeat(self, chatroom_id, channel_name, user_id):
+        return self.join(chatroom_id, channel_name, user_id)
+
+    def expire(self, chatroom_id):
+        return sorted(int(user_id) for user_id in self._expire(keys=self.get_keys(chatroom_id), args=[time.time()]))
+
+    def leave(self, chatroom_id, channel_name):
+        return bool(self._leave(keys=self.get_keys(chatroom_id), args=[channel_name]))
+
+    def online(self, chatroom_id):
+        return sorted(int(user_id) for user_id in self._online(keys=self.get_keys(chatroom_id), args=[time.time()]))
+
+    def count(self, chatroom_id):
+        return len(self.online(chatroom_id))
+
+    def get_keys(self, chatroom_id):
+        # The room id is the hash tag, so a room's keys share a cluster slot.
+        return [f'{self.prefix}:{{{chatroom_id}}}:{name}' for name in ('channels', 'owners', 'users')]
+
+
+_presence = None
+_presence_lock = threading.Lock()
+
+
+def get_presence():
+    """
+    Get the process-wide presence tracker, configured from settings.CHAT_PRESENCE.
+    """
+    global _presence
+    with _presence_lock:
+        if _presence is None:
+            config = getattr(settings, 'CHAT_PRESENCE', {})
+            backend_class = import_string(config.get('BACKEND', 'chats.presence.LocalPresence'))
+            _presence = backend_class(**config.get('OPTIONS', {}))
+        return _presence
@@ -0,0 +1,176 @@
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+MISSING = object()
+
+
+class CacheStats:
+    """
+    Hit and miss counters, kept per kind of cached value.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+
+    def record(self, kind, hit):
+        with self.lock:
+            if hit:
+                self.hits[kind] += 1
+            else:
+                self.misses[kind] += 1
+
+    def snapshot(self):
+        """
+        Get the counters as a dict of kind -> {hits, misses, hit_ratio}.
+        """
+        with self.lock:
+            kinds = set(self.hits) | set(self.misses)
+            result = {}
+            for kind in sorted(kinds):
+                hits, misses = self.hits[kind], self.misses[kind]
+                result[kind] = {
+                    'hits': hits,
+                    'misses': misses,
+                    'hit_ratio': hits / (hits + misses) if hits + misses else 0.0,
+                }
+            return result
+
+    def reset(self):
+        with self.lock:
+            self.hits.clear()
+            self.misses.clear()
+
+
+class LocalLRUCache:
+    """
+    In-process cache backend with LRU eviction and a per-entry TTL.
+    """
+    def __init__(self, max_entries=10000, timeout=300):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return MISSING
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return MISSING
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.timeout)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class DjangoCacheBackend:
+    """
+    Cache backend that stores entries in one of the Django CACHES, so several
+    processes can share them.
+
+    Keys are namespaced by key_prefix and a generation counter; clear()
+    bumps the generation, so only this backend's entries are dropped (they
+    expire on their own) and the rest of the cache alias is left alone.
+    """
+    def __init__(self, alias='default', timeout=300, key_prefix='chats'):
+        self.cache = caches[alias]
+        self.timeout = timeout
+        self.key_prefix = key_prefix
+        self.generation_key = f'{key_prefix}:generation'
+
+    def get(self, key):
+        return self.cache.get(self.make_key(key), MISSING)
+
+    def set(self, key, value):
+        self.cache.set(self.make_key(key), value, self.timeout)
+
+    def delete(self, key):
+        self.cache.delete(self.make_key(key))
+
+    def clear(self):
+        self.cache.add(self.generation_key, 0, None)
+        self.cache.incr(self.generation_key)
+
+    def get_generation(self):
+        generation = self.cache.get(self.generation_key)
+        if generation is None:
+            self.cache.add(self.generation_key, 0, None)
+            generation = self.cache.get(self.generation_key, 0)
+        return generation
+
+    def make_key(self, key):
+        return f'{self.key_prefix}:{self.get_generation()}:{key}'
+
+
+class ChatCache:
+    """
+    Read-through cache for chat room metadata and memberships.
+
+    Keys are namespaced by kind ('room', 'rooms', 'members', 'user_rooms');
+    hits and misses are counted per kind in stats.
+    """
+    def __init__(self, backend):
+        self.backend = backend
+        self.stats = CacheStats()
+
+    def get_or_load(self, kind, key, loader):
+        """
+        Get a cached value, calling loader() and caching its result on a miss.
+        """
+        cache_key = f'{kind}:{key}'
+        value = self.backend.get(cache_key)
+        self.stats.record(kind, value is not MISSING)
+        if value is MISSING:
+            value = loader()
+            self.backend.set(cache_key, value)
+        return value
+
+    def invalidate(self, kind, key):
+        self.backend.delete(f'{kind}:{key}')
+
+    def clear(self):
+        self.backend.clear()
+
+
+def build_chat_cache(config):
+    """
+    Build a ChatCache from a {'BACKEND': ..., 'OPTIONS': {...}} setting.
+    """
+    backend_class = import_string(config.get('BACKEND', 'chats.repository.cache.LocalLRUCache'))
+    return ChatCache(backend_class(**config.get('OPTIONS', {})))
+
+
+_chat_cache = None
+_chat_cache_lock = threading.Lock()
+
+
+def get_chat_cache():
+    """
+    Get the process-wide chat cache, configured from settings.CHAT_CACHE.
+    """
+    global _chat_cache
+    with _chat_cache_lock:
+        if _chat_cache is None:
+            _chat_cache = build_chat_cache(getattr(settings, 'CHAT_CACHE', {}))
+        return _chat_cache
@@ -0,0 +1,296 @@
+from functools import partial
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from chats.entity.models import ChatRoom, Message, Attachment, AttachmentUpload
+from chats.repository import search
+from chats.repository.cache import get_chat_cache
+from channels.layers import get_channel_layer
+from asgiref.sync import async_to_sync
+
+MESSAGE_FIELDS = ('id', 'chatroom_id', 'sender_id', 'sender__username', 'text', 'timestamp')
+
+def format_timestamp(value):
+    """
+    Format a datetime the way DRF's DateTimeField renders it.
+    """
+    value = timezone.localtime(value).isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+def build_message_payload(row, attachments=()):
+    """
+    Build the API representation of a message from a MESSAGE_FIELDS row.
+
+    Matches MessageSerializer field for field; it is used wherever many
+    messages are listed and for the payloads pushed to websocket clients.
+    """
+    return {
+        'id': row['id'],
+        'chatroom': row['chatroom_id'],
+        'sender': {'id': row['sender_id'], 'username': row['sender__username']},
+        'text': row['text'],
+        'timestamp': format_timestamp(row['timestamp']),
+        'attachments': list(attachments),
+    }
+
+def serialize_message(message):
+    """
+    Build the payload pushed to websocket clients for a new message.
+    """
+    return build_message_payload({
+        'id': message.id,
+        'chatroom_id': message.chatroom_id,
+        'sender_id': message.sender_id,
+        'sender__username': message.sender.username,
+        'text': message.text,
+        'timestamp': message.timestamp,
+    })
+
+class ChatRepository:
+    """
+    Repository for chat room operations.
+
+    Room metadata and memberships are read through the chat cache. The
+    receivers in chats.signals invalidate the entries whenever a room is
+    saved or deleted or its members change, however that happens.
+    """
+    def get_chatrooms(self):
+        """
+        Get a list of chat rooms, as rows shaped like ChatRoomSerializer output.
+        """
+        return get_chat_cache().get_or_load(
+            'rooms', 'all', lambda: list(ChatRoom.objects.order_by('id').values('id', 'name', 'max_members')),
+        )
+
+    def get_chatroom(self, chatroom_id):
+        """
+        Get a chat room by id.
+
+        Raises:
+            ChatRoom.DoesNotExist: if there is no such chat room.
+        """
+        return get_chat_cache().get_or_load('room', chatroom_id, lambda: ChatRoom.objects.get(pk=chatroom_id))
+
+    def get_member_ids(self, chatroom_id):
+        """
+        Get the ids of the users in a chat room.
+        """
+        return get_chat_cache().get_or_load(
+            'members', chatroom_id,
+            lambda: frozenset(ChatRoom.members.through.objects.filter(chatroom_id=chatroom_id).values_list('user_id', flat=True)),
+        )
+
+    def get_user_chatrooms(self, user):
+        """
+        Get the chat rooms a user has joined.
+        """
+        return get_chat_cache().get_or_load('user_rooms', user.pk, lambda: list(user.chat_rooms.order_by('id')))
+
+    def create_chatroom(self, name, max_members):
+        """
+        Create a new chat room.
+        """
+        return ChatRoom.objects.create(name=name, max_members=max_members)
+
+    def leave_chatroom(self, user, chatroom):
+        """
+        Leave a chat room.
+        """
+        chatroom.members.remove(user)
+
+    def join_chatroom(self, user, chatroom):
+        """
+        Join a chat room.
+        """
+        chatroom.members.add(user)
+
+    def invalidate_chatroom(self, chatroom_id):
+        """
+        Drop a chat room's cached metadata and the cached room list.
+        """
+        cache = get_chat_cache()
+        cache.invalidate('room', chatroom_id)
+        cache.invalidate('rooms', 'all')
+
+    def invalidate_membership(self, chatroom_ids, user_ids):
+        """
+        Drop the cached members of chat rooms and the cached rooms of users.
+        """
+        cache = get_chat_cache()
+        for chatroom_id in chatroom_ids:
+            cache.invalidate('members', chatroom_id)
+        for user_id in user_ids:
+            cache.invalidate('user_rooms', user_id)
+
+class MessageRepository:
+    """
+    Repository for message operations.
+    """
+    def get_messages(self, chatroom):
+        """
+        Get messages for a chat room.
+        """
+        return Message.objects.filter(chatroom=chatroom).order_by('-timestamp', '-id')
+
+    def get_message_page(self, chatroom, before=None, after=None, limit=50):
+        """
+        Get one page of messages for a chat room, newest first.
+
+        Walks the (chatroom, timestamp, id) index from the cursor message, so
+        the cost of a page does not depend on how large the room is.
+        Returns a tuple of (message payloads, has_more).
+        """
+        messages = Message.objects.filter(chatroom=chatroom)
+
+        # The plain timestamp bound gives the database an index range to seek
+        # into; the OR only breaks ties between messages with equal timestamps.
+        if before is not None:
+            cursor = self._get_cursor(chatroom, before)
+            messages = messages.filter(
+                Q(timestamp__lt=cursor['timestamp']) | Q(id__lt=cursor['id']),
+                timestamp__lte=cursor['timestamp'],
+            ).order_by('-timestamp', '-id')
+        elif after is not None:
+            cursor = self._get_cursor(chatroom, after)
+            messages = messages.filter(
+                Q(timestamp__gt=cursor['timestamp']) | Q(id__gt=cursor['id']),
+                timestamp__gte=cursor['timestamp'],
+            ).order_by('timestamp', 'id')
+        else:
+            messages = messages.order_by('-timestamp', '-id')
+
+        page = self.get_message_payloads(messages[:limit + 1])
+        has_more = len(page) > limit
+        page = page[:limit]
+        if after is not None:
+            page.reverse()
+        return page, has_more
+
+    def search_messages(self, chatroom, query, limit=20, offset=0):
+        """
+        Search a chat room's messages, best match first.
+
+        Uses the full-text index where the database has one, otherwise a
+        case-insensitive text filter ordered newest first.
+        Returns a tuple of (message payloads, has_more).
+        """
+        if search.is_supported(connection):
+            ids = search.search_message_ids(chatroom.pk, query, limit + 1, offset)
+            payloads = {payload['id']: payload for payload in self.get_message_payloads(Message.objects.filter(pk__in=ids[:limit]))}
+            page = [payloads[pk] for pk in ids[:limit] if pk in payloads]
+            return page, len(ids) > limit
+
+        page = self.get_message_payloads(
+            Message.objects.filter(chatroom=chatroom, text__icontains=query)
+            .order_by('-timestamp', '-id')[offset:offset + limit + 1]
+        )
+        return page[:limit], len(page) > limit
+
+    def get_message_payloads(self, messages):
+        """
+        Build API payloads for a queryset of messages, in queryset order.
+
+        Reads plain rows with the sender joined in, plus one query for the
+        attachments of the whole batch, instead of instantiating models.
+        """
+        rows = list(messages.values(*MESSAGE_FIELDS))
+        attachments = {}
+        if rows:
+            storage = Attachment._meta.get_field('file').storage
+            files = (
+                Attachment.objects.filter(message_id__in=[row['id'] for row in rows])
+                .order_by('id').values_list('message_id', 'file')
+            )
+            for message_id, name in files:
+                attachments.setdefault(message_id, []).append(storage.url(name))
+        return [build_message_payload(row, attachments.get(row['id'], ())) for row in rows]
+
+    def _get_cursor(self, chatroom, message_id):
+        cursor = Message.objects.filter(chatroom=chatroom, pk=message_id).values('id', 'timestamp').first()
+        if cursor is None:
+            raise ValueError('Cursor message does not exist in this chat room.')
+        return cursor
+
+    def create_message(self, sender, text, chatroom):
+        """
+        Create a message and publish it to the chat room group once the
+        surrounding transaction commits.
+        """
+        message = Message(chatroom=chatroom, sender=sender, text=text)
+        message.save()
+
+        payload = serialize_message(message)
+        transaction.on_commit(lambda: self.notify_consumers(chatroom.id, payload))
+        return message
+
+    def create_messages(self, messages):
+        """
+        Insert a batch of unsaved messages in one transaction, preserving
+        their order, and publish each of them once the batch commits.
+        """
+        with transaction.atomic():
+            if connection.features.can_return_rows_from_bulk_insert:
+                Message.objects.bulk_create(messages)
+            else:
+                # Without RETURNING the batch would come back without ids.
+                for message in messages:
+                    message.save()
+
+            for message in messages:
+                payload = serialize_message(message)
+                transaction.on_commit(partial(self.notify_consumers, message.chatroom_id, payload))
+        return messages
+
+    def notify_consumers(self, chatroom_id, payload):
+        """
+        Publish a serialized message to everyone connected to the chat room.
+        """
+        channel_layer = get_channel_layer()
+        chatroom_group_name = f"chat_{chatroom_id}"
+
+        async_to_sync(channel_layer.group_send)(
+            chatroom_group_name,
+            {
+                'type': 'chat.message',
+                'message': payload,
+            }
+        )
+
+class AttachmentRepository:
+    """
+    Repository for attachment operations.
+    """
+    def create_attachment(self, message, file, content_type, size=None):
+        """
+        Create a new attachment.
+        """
+        return Attachment.objects.create(message=message, file=file, content_type=content_type, size=size)
+
+    def create_upload(self, message, uploader, filename, size):
+        """
+        Start a new chunked upload.
+        """
+        return AttachmentUpload.objects.create(message=message, uploader=uploader, filename=filename, size=size)
+
+    def get_upload(self, upload_id, uploader):
+        """
+        Get an upload started by `uploader`.
+        """
+        return AttachmentUpload.objects.get(pk=upload_id, uploader=uploader)
+
+    def advance_upload(self, upload_id, start, length):
+        """
+        Move an upload's offset from `start` to `start + length`.
+
+        Returns:
+            bool: False if the offset was no longer `start`.
+        """
+        return AttachmentUpload.objects.filter(pk=upload_id, offset=start).update(offset=start + length) == 1
+
+    def get_abandoned_uploads(self, created_before):
+        """
+        Get the uploads started before `created_before` that never completed.
+        """
+        return AttachmentUpload.objects.filter(attachment__isnull=True, created_at__lt=created_before)
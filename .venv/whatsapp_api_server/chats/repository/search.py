@@ -0,0 +1,151 @@
+import re
+from django.db import connection as default_connection
+
+# SQLite FTS5 index over Message.text. The room is indexed as an 'r<id>'
+# token so a search can be scoped to one room inside the full-text index.
+#
+# The index is a standalone FTS5 table holding its own copy of the text,
+# keyed by message id, and nothing else in the schema refers to
+# chats_message besides the triggers that keep it in sync. A migration that
+# makes SQLite rebuild chats_message therefore goes through; it drops the
+# triggers along with the old table, and the post_migrate receiver in
+# chats.signals puts them back and re-indexes (restore_search_triggers).
+CREATE_SEARCH_TABLE = """
+    CREATE VIRTUAL TABLE chats_message_fts USING fts5(
+        text, room,
+        tokenize='unicode61 remove_diacritics 2'
+    )
+"""
+
+CREATE_SEARCH_TRIGGERS = [
+    """
+    CREATE TRIGGER chats_message_fts_insert AFTER INSERT ON chats_message BEGIN
+        INSERT INTO chats_message_fts(rowid, text, room) VALUES (new.id, new.text, 'r' || new.chatroom_id);
+    END
+    """,
+    """
+    CREATE TRIGGER chats_message_fts_delete AFTER DELETE ON chats_message BEGIN
+        DELETE FROM chats_message_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER chats_message_fts_update AFTER UPDATE OF text, chatroom_id ON chats_message BEGIN
+        UPDATE chats_message_fts SET text = new.text, room = 'r' || new.chatroom_id WHERE rowid = old.id;
+    END
+    """,
+]
+
+REINDEX_MESSAGES = [
+    "DELETE FROM chats_message_fts",
+    "INSERT INTO chats_message_fts(rowid, text, room) SELECT id, text, 'r' || chatroom_id FROM chats_message",
+]
+
+DROP_SEARCH_INDEX = [
+    "DROP TRIGGER IF EXISTS chats_message_fts_update",
+    "DROP TRIGGER IF EXISTS chats_message_fts_delete",
+    "DROP TRIGGER IF EXISTS chats_message_fts_insert",
+    "DROP TABLE IF EXISTS chats_message_fts",
+    # Left behind by the first version of the index, which read its content
+    # through this view and so blocked rebuilding chats_message.
+    "DROP VIEW IF EXISTS chats_message_search_source",
+]
+
+TERM_PATTERN = re.compile(r'\w+\*?')
+
+
+def is_supported(connection=default_connection):
+    """
+    Whether the database keeps a full-text index of messages.
+    """
+    return connection.vendor == 'sqlite'
+
+
+def create_search_index(connection=default_connection):
+    """
+    Create the full-text index and its triggers, then index every message.
+    """
+    if not is_supported(connection):
+        return
+    with connection.cursor() as cursor:
+        for statement in [CREATE_SEARCH_TABLE, *CREATE_SEARCH_TRIGGERS, *REINDEX_MESSAGES]:
+            cursor.execute(statement)
+
+
+def drop_search_index(connection=default_connection):
+    if not is_supported(connection):
+        return
+    with connection.cursor() as cursor:
+        for statement in DROP_SEARCH_INDEX:
+            cursor.execute(statement)
+
+
+def restore_search_triggers(connection=default_connection):
+    """
+    Recreate the index triggers if rebuilding chats_message dropped them,
+    and re-index every message, since writes made meanwhile were missed.
+
+    Returns:
+        bool: True if the triggers had to be restored.
+    """
+    if not is_supported(connection):
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE name IN ('chats_message_fts', 'chats_message_fts_insert')"
+        )
+        names = {row[0] for row in cursor.fetchall()}
+        if names != {'chats_message_fts'}:
+            return False
+        for statement in [*DROP_SEARCH_INDEX[:3], *CREATE_SEARCH_TRIGGERS, *REINDEX_MESSAGES]:
+            cursor.execute(statement)
+    return True
+
+
+def optimize_search_index(connection=default_connection):
+    """
+    Merge the index b-trees into one, which speeds up later queries.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("INSERT INTO chats_message_fts(chats_message_fts) VALUES ('optimize')")
+
+
+def build_match_expression(query):
+    """
+    Turn free text into an FTS5 expression matching all of its words.
+
+    Every word is quoted, so user input cannot inject FTS5 operators; a
+    trailing '*' on a word is kept as a prefix search.
+
+    Returns:
+        str or None: None if the query has no searchable words.
+    """
+    terms = []
+    for term in TERM_PATTERN.findall(query):
+        if term.endswith('*'):
+            terms.append(f'"{term[:-1]}"*')
+        else:
+            terms.append(f'"{term}"')
+    if not terms:
+        return None
+    return ' '.join(terms)
+
+
+def search_message_ids(chatroom_id, query, limit, offset=0, connection=default_connection):
+    """
+    Get the ids of a room's messages matching query, best match first.
+    """
+    expression = build_match_expression(query)
+    if expression is None:
+        return []
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT rowid FROM chats_message_fts
+            WHERE chats_message_fts MATCH %s
+            ORDER BY bm25(chats_message_fts, 1.0, 0.0), rowid DESC
+            LIMIT %s OFFSET %s
+            """,
+            [f'room: r{int(chatroom_id)} AND text: ({expression})', limit, offset],
+        )
+        return [row[0] for row in cursor.fetchall()]
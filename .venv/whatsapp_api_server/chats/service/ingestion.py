@@ -0,0 +1,167 @@
+import asyncio
+import atexit
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connections
+from chats.entity.models import Message
+from chats.repository.repository import MessageRepository
+
+
+class MessageIngestionQueue:
+    """
+    In-process queue that batches message writes.
+
+    Producers submit messages from sync code (submit) or from an event loop
+    (asubmit). A writer task running on the queue's own event loop collects
+    up to batch_size messages, or whatever arrives within flush_interval
+    seconds, and inserts them in a single transaction. Each producer gets
+    back its own saved Message, with its id, once the batch commits.
+
+    Messages are written in submission order, so ids and timestamps follow
+    the order in which they were queued. At most max_pending messages wait
+    in the queue; beyond that, producers wait for room, so an overloaded
+    writer slows senders down instead of queueing without bound.
+    """
+    def __init__(self, batch_size=100, flush_interval=0.01, max_pending=10000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.loop = None
+        self.queue = None
+        self.thread = None
+        self.writer = None
+        # Database work stays on one thread, and therefore one connection.
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='message-writer')
+        self.lock = threading.Lock()
+
+    def start(self):
+        """
+        Start the event loop thread and the writer task.
+        """
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.loop = asyncio.new_event_loop()
+            started = threading.Event()
+            self.thread = threading.Thread(target=self._run, args=(started,), name='message-ingestion', daemon=True)
+            self.thread.start()
+            started.wait()
+
+    def stop(self):
+        """
+        Write everything still queued, then stop the writer.
+        """
+        with self.lock:
+            if self.thread is None:
+                return
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop).result()
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.executor.submit(connections.close_all).result()
+            self.loop.close()
+            self.thread = None
+
+    def submit(self, chatroom, sender, text):
+        """
+        Queue a message from sync code.
+
+        Returns:
+            concurrent.futures.Future: resolves to the saved Message.
+        """
+        self.start()
+        return asyncio.run_coroutine_threadsafe(self._enqueue(chatroom, sender, text), self.loop)
+
+    async def asubmit(self, chatroom, sender, text):
+        """
+        Queue a message from async code and wait until it is saved.
+        """
+        return await asyncio.wrap_future(self.submit(chatroom, sender, text))
+
+    def _run(self, started):
+        asyncio.set_event_loop(self.loop)
+        self.queue = asyncio.Queue(maxsize=self.max_pending)
+        self.writer = self.loop.create_task(self._write_batches())
+        started.set()
+        self.loop.run_forever()
+
+    async def _enqueue(self, chatroom, sender, text):
+        future = self.loop.create_future()
+        await self.queue.put((Message(chatroom=chatroom, sender=sender, text=text), future))
+        return await future
+
+    async def _shutdown(self):
+        await self.queue.join()
+        self.writer.cancel()
+
+    async def _write_batches(self):
+        while True:
+            batch = [await self.queue.get()]
+            deadline = self.loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - self.loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # A producer that gave up waiting has cancelled its future and
+            # told its client the message failed, so do not save it.
+            pending = [(message, future) for message, future in batch if not future.cancelled()]
+            if pending:
+                try:
+                    results = await self.loop.run_in_executor(
+                        self.executor, self._write, [message for message, _ in pending]
+                    )
+                except Exception as e:
+                    results = [e] * len(pending)
+
+                for (_, future), result in zip(pending, results):
+                    if not future.done():
+                        if isinstance(result, Exception):
+                            future.set_exception(result)
+                        else:
+                            future.set_result(result)
+            for _ in batch:
+                self.queue.task_done()
+
+    def _write(self, messages):
+        # The writer thread lives as long as the process and never sees the
+        # request_started/finished signals, so drop a broken or expired
+        # connection here instead of failing every later batch on it.
+        close_old_connections()
+        try:
+            return MessageRepository().create_messages(messages)
+        except DatabaseError:
+            pass
+
+        # Retry one by one so a single bad row does not fail its whole batch.
+        results = []
+        for message in messages:
+            try:
+                results.extend(MessageRepository().create_messages([message]))
+            except DatabaseError as e:
+                results.append(e)
+        return results
+
+
+_ingestion_queue = None
+_ingestion_queue_lock = threading.Lock()
+
+
+def get_ingestion_queue():
+    """
+    Get the process-wide ingestion queue, configured from settings.
+    """
+    global _ingestion_queue
+    with _ingestion_queue_lock:
+        if _ingestion_queue is None:
+            _ingestion_queue = MessageIngestionQueue(
+                batch_size=getattr(settings, 'CHAT_INGESTION_BATCH_SIZE', 100),
+                flush_interval=getattr(settings, 'CHAT_INGESTION_FLUSH_MS', 10) / 1000,
+                max_pending=getattr(settings, 'CHAT_INGESTION_MAX_PENDING', 10000),
+            )
+            atexit.register(_ingestion_queue.stop)
+        return _ingestion_queue
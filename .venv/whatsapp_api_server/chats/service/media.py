@@ -0,0 +1,211 @@
+import atexit
+import json
+import logging
+import os
+import shutil
+import struct
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional; without it no thumbnails are generated.
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+SNIFF_BYTES = 64
+THUMBNAIL_SIZE = (320, 320)
+
+# (offset, signature, content type), checked in order.
+SIGNATURES = [
+    (0, b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (0, b'\xff\xd8\xff', 'image/jpeg'),
+    (0, b'GIF87a', 'image/gif'),
+    (0, b'GIF89a', 'image/gif'),
+    (0, b'%PDF-', 'application/pdf'),
+    (0, b'\x1aE\xdf\xa3', 'video/webm'),
+    (0, b'OggS', 'audio/ogg'),
+    (0, b'ID3', 'audio/mpeg'),
+]
+
+
+def sniff_content_type(head):
+    """
+    Detect a file's content type from its leading bytes.
+
+    Args:
+        head (bytes): at least the first SNIFF_BYTES bytes of the file.
+
+    Returns:
+        str: a MIME type, 'application/octet-stream' if unknown.
+    """
+    for offset, signature, content_type in SIGNATURES:
+        if head[offset:offset + len(signature)] == signature:
+            return content_type
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    if head[4:8] == b'ftyp':
+        brand = head[8:12]
+        if brand == b'qt  ':
+            return 'video/quicktime'
+        if brand in (b'heic', b'heix', b'mif1'):
+            return 'image/heic'
+        if brand.startswith(b'M4A'):
+            return 'audio/mp4'
+        return 'video/mp4'
+    return 'application/octet-stream'
+
+
+def sniff_file(file):
+    """
+    Detect the content type of a file object without moving its position.
+    """
+    position = file.tell()
+    head = file.read(SNIFF_BYTES)
+    file.seek(position)
+    return sniff_content_type(head)
+
+
+def image_dimensions(path):
+    """
+    Read (width, height) from a PNG, GIF or JPEG header, or None.
+    """
+    with open(path, 'rb') as f:
+        head = f.read(26)
+        if head[:8] == b'\x89PNG\r\n\x1a\n':
+            return struct.unpack('>II', head[16:24])
+        if head[:6] in (b'GIF87a', b'GIF89a'):
+            return struct.unpack('<HH', head[6:10])
+        if head[:2] != b'\xff\xd8':
+            return None
+
+        # Walk the JPEG segments up to the first start-of-frame marker.
+        f.seek(2)
+        while True:
+            marker = f.read(2)
+            if len(marker) < 2 or marker[0] != 0xFF:
+                return None
+            length = struct.unpack('>H', f.read(2))[0]
+            if 0xC0 <= marker[1] <= 0xCF and marker[1] not in (0xC4, 0xC8, 0xCC):
+                height, width = struct.unpack('>xHH', f.read(5))
+                return width, height
+            f.seek(length - 2, os.SEEK_CUR)
+
+
+def video_metadata(path):
+    """
+    Read duration and dimensions of a video with ffprobe, if it is installed.
+    """
+    if shutil.which('ffprobe') is None:
+        return {}
+    try:
+        output = subprocess.run(
+            ['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-show_entries',
+             'stream=width,height:format=duration', '-of', 'json', path],
+            capture_output=True, check=True, timeout=30,
+        ).stdout
+    except (OSError, subprocess.SubprocessError):
+        return {}
+
+    probe = json.loads(output or b'{}')
+    metadata = {}
+    streams = probe.get('streams') or [{}]
+    if 'width' in streams[0]:
+        metadata['width'] = streams[0]['width']
+        metadata['height'] = streams[0]['height']
+    if 'duration' in probe.get('format', {}):
+        metadata['duration'] = float(probe['format']['duration'])
+    return metadata
+
+
+def make_thumbnail(path):
+    """
+    Render a JPEG thumbnail of an image, or None without Pillow.
+    """
+    if Image is None:
+        return None
+    with Image.open(path) as image:
+        image.thumbnail(THUMBNAIL_SIZE)
+        output = BytesIO()
+        image.convert('RGB').save(output, 'JPEG', quality=80)
+    return output.getvalue()
+
+
+def process_attachment(attachment_id):
+    """
+    Extract metadata and a thumbnail for a stored attachment.
+    """
+    from chats.entity.models import Attachment
+
+    attachment = Attachment.objects.get(pk=attachment_id)
+    try:
+        path = attachment.file.path
+        metadata = {}
+        thumbnail = None
+        if attachment.content_type.startswith('image/'):
+            dimensions = image_dimensions(path)
+            if dimensions:
+                metadata['width'], metadata['height'] = dimensions
+            thumbnail = make_thumbnail(path)
+        elif attachment.content_type.startswith('video/'):
+            metadata.update(video_metadata(path))
+
+        attachment.size = attachment.file.size
+        attachment.metadata = metadata
+        if thumbnail is not None:
+            attachment.thumbnail.save(f'{attachment.pk}.jpg', ContentFile(thumbnail), save=False)
+        attachment.processing_status = Attachment.PROCESSING_DONE
+    except Exception:
+        logger.exception('Processing attachment %s failed', attachment_id)
+        attachment.processing_status = Attachment.PROCESSING_FAILED
+
+    attachment.save(update_fields=['size', 'metadata', 'thumbnail', 'processing_status'])
+    return attachment
+
+
+class MediaProcessor:
+    """
+    Worker pool that processes attachments off the request path.
+    """
+    def __init__(self, max_workers=2):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='media-worker')
+
+    def submit(self, attachment_id):
+        """
+        Queue an attachment for processing.
+
+        Returns:
+            concurrent.futures.Future: resolves to the processed Attachment.
+        """
+        return self.executor.submit(self._run, attachment_id)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+    def _run(self, attachment_id):
+        try:
+            return process_attachment(attachment_id)
+        finally:
+            connection.close()
+
+
+_media_processor = None
+_media_processor_lock = threading.Lock()
+
+
+def get_media_processor():
+    """
+    Get the process-wide media worker pool, sized by CHAT_MEDIA_WORKERS.
+    """
+    global _media_processor
+    with _media_processor_lock:
+        if _media_processor is None:
+            _media_processor = MediaProcessor(max_workers=getattr(settings, 'CHAT_MEDIA_WORKERS', 2))
+            atexit.register(_media_processor.shutdown)
+        return _media_processor
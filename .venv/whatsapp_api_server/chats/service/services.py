@@ -0,0 +1,320 @@
+import os
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files import File, locks
+from django.db import transaction
+from django.utils import timezone
+from chats.authentication import get_token_cache
+from chats.metrics import get_metrics
+from chats.repository.cache import get_chat_cache
+from chats.repository.repository import ChatRepository, MessageRepository, AttachmentRepository
+from chats.presence import get_presence
+from chats.service.ingestion import get_ingestion_queue
+from chats.service.media import get_media_processor, sniff_content_type, sniff_file, SNIFF_BYTES
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from asgiref.sync import async_to_sync
+from chats.entity.models import ChatRoom, Message, Attachment
+
+class ChatService:
+    """
+    Service for chat room business logic.
+    """
+    def get_chatrooms(self):
+        """
+        Get a list of chat rooms.
+        """
+        return ChatRepository().get_chatrooms()
+
+    def create_chatroom(self, name, max_members):
+        """
+        Create a new chat room.
+        """
+        return ChatRepository().create_chatroom(name, max_members)
+
+    def get_chatroom(self, chatroom_id):
+        """
+        Get a chat room by id.
+        """
+        return ChatRepository().get_chatroom(chatroom_id)
+
+    def is_member(self, user, chatroom_id):
+        """
+        Check whether a user has joined a chat room.
+        """
+        return user.is_authenticated and user.pk in ChatRepository().get_member_ids(chatroom_id)
+
+    def leave_chatroom(self, user, chatroom):
+        """
+        Leave a chat room.
+        """
+        ChatRepository().leave_chatroom(user, chatroom)
+
+    def get_online_members(self, chatroom_id):
+        """
+        Get the ids of the users currently connected to a chat room.
+        """
+        return get_presence().online(chatroom_id)
+
+    def get_user_chatrooms(self, user):
+        """
+        Get a list of user chat rooms.
+        """
+        return ChatRepository().get_user_chatrooms(user)
+    
+    def join_chatroom(self, user, chatroom):
+        """
+        Join a chat room.
+        """
+        ChatRepository().join_chatroom(user, chatroom)
+
+class MessageService:
+    """
+    Service for message business logic.
+    """
+    def get_messages(self, chatroom):
+        """
+        Get messages for a chat room.
+        """
+        return MessageRepository().get_messages(chatroom)
+
+    def get_message_page(self, chatroom, before=None, after=None, limit=50):
+        """
+        Get one page of messages for a chat room, newest first.
+        """
+        return MessageRepository().get_message_page(chatroom, before=before, after=after, limit=limit)
+
+    def search_messages(self, chatroom, query, limit=20, offset=0):
+        """
+        Search messages in a chat room, best match first.
+        """
+        return MessageRepository().search_messages(chatroom, query, limit=limit, offset=offset)
+
+    def create_message(self, chatroom, sender, text):
+        """
+        create and send message into a chat room
+
+        Raises:
+            concurrent.futures.TimeoutError: if the ingestion queue does not
+            save the message within CHAT_INGESTION_TIMEOUT_MS.
+        """
+        if self.is_queued_ingestion():
+            future = get_ingestion_queue().submit(chatroom, sender, text)
+            try:
+                return future.result(timeout=getattr(settings, 'CHAT_INGESTION_TIMEOUT_MS', 5000) / 1000)
+            except TimeoutError:
+                # The message is dropped unless the writer already saved it.
+                if future.cancel():
+                    raise
+                return future.result()
+        return MessageRepository().create_message(sender, text, chatroom)
+
+    async def acreate_message(self, chatroom, sender, text):
+        """
+        create and send message into a chat room from async code
+        """
+        if self.is_queued_ingestion():
+            return await get_ingestion_queue().asubmit(chatroom, sender, text)
+        return await database_sync_to_async(MessageRepository().create_message)(sender, text, chatroom)
+
+    def is_queued_ingestion(self):
+        """
+        Whether messages go through the batching ingestion queue.
+        """
+        return getattr(settings, 'CHAT_MESSAGE_INGESTION', 'direct') == 'queued'
+        
+class PartialUploadFile(File):
+    """
+    A fully received chunked upload, which storages may move into place
+    instead of copying.
+    """
+    def temporary_file_path(self):
+        return self.file.name
+
+
+class AttachmentService:
+    """
+    Service for attachment business logic.
+    """
+    chunk_read_size = 64 * 1024
+
+    def create_attachment(self, message, file):
+        """
+        Create a new attachment.
+        """
+        attachment = AttachmentRepository().create_attachment(message, file, sniff_file(file), size=file.size)
+        self.schedule_processing(attachment)
+        return attachment
+
+    def can_attach(self, user, message):
+        """
+        Whether a user may attach files to a message: its sender, or a member
+        of its chat room.
+        """
+        return message.sender_id == user.pk or ChatService().is_member(user, message.chatroom_id)
+
+    def start_upload(self, message, uploader, filename, size):
+        """
+        Start a resumable chunked upload of a file of `size` bytes.
+        """
+        max_size = getattr(settings, 'CHAT_MAX_UPLOAD_SIZE', 2 * 1024 ** 3)
+        if size < 1 or size > max_size:
+            raise ValueError(f'File size should be between 1 and {max_size} bytes.')
+        return AttachmentRepository().create_upload(message, uploader, filename, size)
+
+    def append_chunk(self, upload_id, uploader, start, length, stream, total=None):
+        """
+        Append `length` bytes read from `stream` to an upload at offset `start`.
+
+        `total`, the file size the client sent with the chunk, if any, must
+        match the size declared when the upload started.
+
+        The body is copied to disk in small pieces, so memory use does not
+        depend on the chunk size, and without a database transaction open, so
+        a slow client does not hold up other writers. Chunks of one upload are
+        serialized by a lock on its partial file. Once every byte has arrived
+        the upload is turned into an Attachment.
+
+        Returns:
+            AttachmentUpload: the upload with its new offset.
+        """
+        upload = AttachmentRepository().get_upload(upload_id, uploader)
+        self.check_chunk(upload, start, length, total)
+
+        path = self.get_partial_path(upload)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(os.open(path, os.O_RDWR | os.O_CREAT, 0o600), 'r+b') as f:
+            locks.lock(f, locks.LOCK_EX)
+            try:
+                # Another chunk may have landed while this one waited for the lock.
+                upload.refresh_from_db()
+                self.check_chunk(upload, start, length, total)
+
+                # Drop whatever a previously interrupted chunk left behind.
+                f.truncate(start)
+                f.seek(start)
+                received = 0
+                while received < length:
+                    data = stream.read(min(self.chunk_read_size, length - received))
+                    if not data:
+                        break
+                    f.write(data)
+                    received += len(data)
+                if received != length:
+                    f.truncate(start)
+                    raise ValueError(f'Expected {length} bytes but received {received}.')
+                f.flush()
+
+                if not AttachmentRepository().advance_upload(upload.pk, start, length):
+                    raise ValueError('Upload changed while the chunk was received, resume from its offset.')
+                upload.offset = start + length
+            finally:
+                locks.unlock(f)
+
+        if upload.offset == upload.size:
+            self.complete_upload(upload)
+        return upload
+
+    def check_chunk(self, upload, start, length, total):
+        """
+        Raise ValueError if a chunk cannot be appended to an upload.
+        """
+        if upload.attachment_id is not None:
+            raise ValueError('Upload is already complete.')
+        if total is not None and total != upload.size:
+            raise ValueError(f'File size should be {upload.size} bytes, as declared.')
+        if start != upload.offset:
+            raise ValueError(f'Chunk should start at byte {upload.offset}.')
+        if length < 1 or start + length > upload.size:
+            raise ValueError('Chunk does not fit in the declared file size.')
+
+    def complete_upload(self, upload):
+        """
+        Store a fully received upload as an attachment of its message.
+
+        The partial file is moved into storage rather than copied where the
+        storage allows it (FileSystemStorage does), before the attachment row
+        is written.
+        """
+        path = self.get_partial_path(upload)
+        with open(path, 'rb') as f:
+            content_type = sniff_content_type(f.read(SNIFF_BYTES))
+            f.seek(0)
+            with transaction.atomic():
+                attachment = AttachmentRepository().create_attachment(
+                    upload.message, PartialUploadFile(f, name=upload.filename), content_type, size=upload.size
+                )
+                upload.attachment = attachment
+                upload.save(update_fields=['attachment'])
+
+        if os.path.exists(path):
+            os.remove(path)
+        self.schedule_processing(attachment)
+        return attachment
+
+    def schedule_processing(self, attachment):
+        """
+        Hand an attachment to the media worker pool once it is committed.
+        """
+        transaction.on_commit(lambda: get_media_processor().submit(attachment.pk))
+
+    def clean_abandoned_uploads(self):
+        """
+        Delete uploads started more than CHAT_UPLOAD_EXPIRY_HOURS ago that are
+        still incomplete, and partial files in CHAT_UPLOAD_TEMP_DIR untouched
+        for that long.
+
+        Returns:
+            int: the number of partial files removed.
+        """
+        expiry = timedelta(hours=getattr(settings, 'CHAT_UPLOAD_EXPIRY_HOURS', 24))
+        uploads = AttachmentRepository().get_abandoned_uploads(timezone.now() - expiry)
+        paths = [self.get_partial_path(upload) for upload in uploads]
+        uploads.delete()
+
+        upload_dir = self.get_upload_dir()
+        if os.path.isdir(upload_dir):
+            cutoff = time.time() - expiry.total_seconds()
+            with os.scandir(upload_dir) as entries:
+                paths.extend(
+                    entry.path for entry in entries
+                    if entry.name.endswith('.part') and entry.stat().st_mtime < cutoff
+                )
+
+        removed = 0
+        for path in set(paths):
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def get_upload_dir(self):
+        return getattr(settings, 'CHAT_UPLOAD_TEMP_DIR', os.path.join(settings.MEDIA_ROOT, 'partial_uploads'))
+
+    def get_partial_path(self, upload):
+        return os.path.join(self.get_upload_dir(), f'{upload.pk}.part')
+
+
+class MetricsService:
+    """
+    Service for request, consumer and cache metrics.
+    """
+    def get_metrics(self):
+        """
+        Get latency and query metrics per view and consumer handler, along
+        with hit ratios of the chat and token caches.
+        """
+        return {
+            'handlers': get_metrics().snapshot(),
+            'cache': get_chat_cache().stats.snapshot(),
+            'token_cache': get_token_cache().stats.snapshot(),
+        }
+
+    def reset_metrics(self):
+        get_metrics().reset()
+        get_chat_cache().stats.reset()
+        get_token_cache().stats.reset()
@@ -0,0 +1,75 @@
+from django.contrib.auth.models import User
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save, pre_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+from chats.authentication import invalidate_token
+from chats.entity.models import ChatRoom
+from chats.metrics import install_query_tracking
+from chats.repository import search
+from chats.repository.repository import ChatRepository
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def invalidate_cached_token(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+def invalidate_cached_user_tokens(sender, instance, created, **kwargs):
+    # A deactivated or edited user must not keep authenticating from the cache.
+    if not created:
+        for key in Token.objects.filter(user=instance).values_list('key', flat=True):
+            invalidate_token(key)
+
+
+
+@receiver(post_save, sender=ChatRoom)
+def invalidate_cached_chatroom(sender, instance, **kwargs):
+    ChatRepository().invalidate_chatroom(instance.pk)
+
+
+@receiver(pre_delete, sender=ChatRoom)
+def remember_deleted_chatroom_members(sender, instance, **kwargs):
+    # The membership rows are gone by post_delete.
+    instance._chats_member_ids = list(instance.members.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=ChatRoom)
+def invalidate_deleted_chatroom(sender, instance, **kwargs):
+    ChatRepository().invalidate_chatroom(instance.pk)
+    ChatRepository().invalidate_membership([instance.pk], instance.__dict__.pop('_chats_member_ids', []))
+
+
+@receiver(m2m_changed, sender=ChatRoom.members.through)
+def invalidate_cached_membership(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear', 'post_clear'):
+        return
+    # clear() passes no pk_set; remember who was affected before the rows go.
+    if action == 'pre_clear':
+        related = 'chatroom_id' if reverse else 'user_id'
+        field = 'user_id' if reverse else 'chatroom_id'
+        pk_set = set(sender.objects.filter(**{field: instance.pk}).values_list(related, flat=True))
+        instance._chats_cleared_pks = pk_set
+    elif action == 'post_clear':
+        pk_set = instance.__dict__.pop('_chats_cleared_pks', set())
+
+    if reverse:
+        ChatRepository().invalidate_membership(pk_set, [instance.pk])
+    else:
+        ChatRepository().invalidate_membership([instance.pk], pk_set)
+
+
+
+@receiver(post_migrate)
+def restore_message_search_triggers(sender, using, **kwargs):
+    # Migrations that make SQLite rebuild chats_message drop the index triggers.
+    # The chats models live outside chats.models, so Django does not send
+    # post_migrate for this app; any app's signal will do, the check is cheap.
+    search.restore_search_triggers(connections[using])
+
+
+# Count queries per request and consumer handler for the metrics endpoint.
+connection_created.connect(install_query_tracking)
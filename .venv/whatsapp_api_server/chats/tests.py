@@ -0,0 +1,910 @@
+import asyncio
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
+import uuid
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipUnless
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.core.management import call_command
+from django.core.management.sql import emit_post_migrate_signal
+from django.db import connection, migrations, models
+from django.db.migrations.executor import MigrationExecutor
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, Client, override_settings
+from django.contrib.auth import get_user_model
+from chats.authentication import TokenAuthMiddlewareStack, get_token_cache
+from chats.consumer import ChatConsumer
+from chats.entity.models import Attachment, AttachmentUpload, ChatRoom, Message
+from chats.layers import SQLiteChannelLayer
+from chats.metrics import LatencyHistogram, get_metrics
+from chats.presence import LocalPresence, RedisPresence, SQLitePresence, get_presence
+from chats.controller.renderers import FastJSONRenderer
+from chats.controller.serializers import ChatRoomSerializer, MessageSerializer
+from chats.repository.repository import MessageRepository
+from chats.repository import search
+from chats.repository.cache import MISSING, DjangoCacheBackend, LocalLRUCache, build_chat_cache, get_chat_cache
+from chats.service.ingestion import MessageIngestionQueue, get_ingestion_queue
+from chats.service.media import process_attachment, sniff_content_type
+from chats.service.services import AttachmentService, ChatService, MessageService
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+
+class ChatroomTestCase(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = get_user_model().objects.create_user(username="testuser", password="testpassword")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        
+        self.chatroom = ChatRoom.objects.create(name='Test Chatroom', max_members= '20')
+        self.chatroom.members.add(self.user)
+
+    def test_register_user(self):
+        response = self.client.post('/api/createuser/', {'username': 'newuser', 'password': 'newpassword'})
+        self.assertEqual(response.status_code, 201)
+
+    def test_login_user(self):
+        response = self.client.post('/api/login/', {'username': 'testuser', 'password': 'testpassword'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_create_chatrooms(self):
+        response = self.client.post('/api/chatrooms/', {'name': 'chatroom 1', 'max_members': '20'})
+        self.assertEqual(response.status_code, 201)
+        
+    def test_list_chatrooms(self):
+        response = self.client.get('/api/chatrooms/')
+        self.assertEqual(response.status_code, 200)
+        response_json = response.json()
+        self.assertIsInstance(response_json, list)
+
+    def test_send_message(self):
+        url = reverse('message-list-create', kwargs={'chatroom_id': self.chatroom.id})
+        data = {'text': 'Welcome to this room', 'chatroom': self.chatroom.id}
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        
+    def test_list_messages_by_chatroom_id(self):
+        url = reverse('message-list-create', kwargs={'chatroom_id': self.chatroom.id})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_list_messages_paginates_with_cursor(self):
+        for i in range(5):
+            Message.objects.create(chatroom=self.chatroom, sender=self.user, text=f'message {i}')
+        url = reverse('message-list-create', kwargs={'chatroom_id': self.chatroom.id})
+
+        response = self.client.get(url, {'page_size': 2})
+        self.assertEqual(response.status_code, 200)
+        page = response.json()
+        self.assertEqual([m['text'] for m in page['results']], ['message 4', 'message 3'])
+        self.assertIsNone(page['previous'])
+
+        page = self.client.get(page['next']).json()
+        self.assertEqual([m['text'] for m in page['results']], ['message 2', 'message 1'])
+
+        page = self.client.get(page['next']).json()
+        self.assertEqual([m['text'] for m in page['results']], ['message 0'])
+        self.assertIsNone(page['next'])
+
+        page = self.client.get(page['previous']).json()
+        self.assertEqual([m['text'] for m in page['results']], ['message 2', 'message 1'])
+
+    def test_message_list_fast_path_matches_serializer(self):
+        messages = [Message.objects.create(chatroom=self.chatroom, sender=self.user, text=f'message {i}') for i in range(3)]
+        Attachment.objects.create(message=messages[1], file='attachments/other/notes.txt', content_type='text/plain')
+        queryset = Message.objects.filter(chatroom=self.chatroom).order_by('-id')
+
+        with self.assertNumQueries(2):
+            payloads = MessageRepository().get_message_payloads(queryset)
+        self.assertEqual(payloads, MessageSerializer(queryset, many=True).data)
+        self.assertEqual(payloads[1]['attachments'], ['/media/attachments/other/notes.txt'])
+
+        data = {
+            'results': payloads, 'next': None, 'emoji': 'caf\u00e9 \U0001f600 \u2013', 'ratio': 0.1,
+            'separators': 'a\u2028b\u2029c', 'counts': {1: 'one', 2: 'two'},
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_list_chatrooms_matches_serializer(self):
+        get_chat_cache().clear()
+        response = self.client.get('/api/chatrooms/')
+        self.assertEqual(response.json(), ChatRoomSerializer(ChatRoom.objects.order_by('id'), many=True).data)
+
+    def test_list_messages_rejects_unknown_cursor(self):
+        url = reverse('message-list-create', kwargs={'chatroom_id': self.chatroom.id})
+        response = self.client.get(url, {'before': 999999})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_send_message_publishes_to_chatroom_group(self):
+        channel_layer = get_channel_layer()
+        channel_name = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)(f'chat_{self.chatroom.id}', channel_name)
+
+        url = reverse('message-list-create', kwargs={'chatroom_id': self.chatroom.id})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url, {'text': 'Hello group', 'chatroom': self.chatroom.id})
+
+        event = async_to_sync(channel_layer.receive)(channel_name)
+        self.assertEqual(event['type'], 'chat.message')
+        self.assertEqual(event['message']['text'], 'Hello group')
+        self.assertEqual(event['message']['sender'], {'id': self.user.id, 'username': 'testuser'})
+
+
+class ChatConsumerTestCase(TransactionTestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="testuser", password="testpassword")
+        self.chatroom = ChatRoom.objects.create(name='Test Chatroom', max_members=20)
+        self.chatroom.members.add(self.user)
+
+    async def connect(self):
+        communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), f'/ws/chat/{self.chatroom.id}/')
+        communicator.scope['url_route'] = {'kwargs': {'chatroom_id': str(self.chatroom.id)}}
+        communicator.scope['user'] = self.user
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        frame = await communicator.receive_json_from(timeout=2)
+        self.assertEqual(frame['type'], 'presence')
+        return communicator
+
+    async def test_presence_tracks_connections(self):
+        communicator = await self.connect()
+        self.assertEqual(get_presence().online(self.chatroom.id), [self.user.id])
+
+        client = APIClient()
+        await database_sync_to_async(client.force_authenticate)(user=self.user)
+        response = await database_sync_to_async(client.get)(reverse('chatroom-presence', kwargs={'chatroom_id': self.chatroom.id}))
+        self.assertEqual(response.json(), {'chatroom': self.chatroom.id, 'online_count': 1, 'online': [self.user.id]})
+
+        await communicator.disconnect()
+        self.assertEqual(get_presence().count(self.chatroom.id), 0)
+
+    async def test_heartbeat_after_expiry_rejoins(self):
+        presence = LocalPresence(ttl=0.1)
+        with mock.patch('chats.consumer.get_presence', return_value=presence):
+            communicator = await self.connect()
+            await asyncio.sleep(0.2)
+            await communicator.send_json_to({'type': 'heartbeat'})
+
+            events = [await communicator.receive_json_from(timeout=2) for _ in range(2)]
+            self.assertEqual([(e['event'], e['user_id']) for e in events], [('left', self.user.id), ('joined', self.user.id)])
+            self.assertEqual(events[1]['online_count'], 1)
+
+            await communicator.disconnect()
+            self.assertEqual(presence.online(self.chatroom.id), [])
+
+    async def test_receive_persists_and_broadcasts_message(self):
+        communicator = await self.connect()
+        await communicator.send_json_to({'type': 'chat.message', 'text': 'Hello socket'})
+
+        frame = await communicator.receive_json_from(timeout=2)
+        self.assertEqual(frame['type'], 'chat.messages')
+        self.assertEqual([m['text'] for m in frame['messages']], ['Hello socket'])
+        self.assertTrue(await database_sync_to_async(
+            Message.objects.filter(pk=frame['messages'][0]['id'], chatroom=self.chatroom).exists
+        )())
+        await communicator.disconnect()
+
+    async def test_handlers_are_timed(self):
+        get_metrics().reset()
+        communicator = await self.connect()
+        await communicator.send_json_to({'type': 'chat.message', 'text': 'Hello socket'})
+        await communicator.receive_json_from(timeout=2)
+        await communicator.disconnect()
+
+        metrics = get_metrics().snapshot()
+        self.assertEqual(metrics['ChatConsumer.websocket_receive']['latency_ms']['count'], 1)
+        # The insert runs in a sync_to_async thread and is still counted.
+        self.assertGreaterEqual(metrics['ChatConsumer.websocket_receive']['queries'], 1)
+        self.assertEqual(metrics['ChatConsumer.websocket_disconnect']['errors'], 0)
+
+    async def test_non_members_are_rejected(self):
+        outsider = await database_sync_to_async(get_user_model().objects.create_user)(username="outsider", password="testpassword")
+        communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), f'/ws/chat/{self.chatroom.id}/')
+        communicator.scope['url_route'] = {'kwargs': {'chatroom_id': str(self.chatroom.id)}}
+        communicator.scope['user'] = outsider
+        connected, _ = await communicator.connect()
+        self.assertFalse(connected)
+
+    async def test_token_authenticates_websocket(self):
+        token = await database_sync_to_async(Token.objects.create)(user=self.user)
+        application = TokenAuthMiddlewareStack(ChatConsumer.as_asgi())
+
+        communicator = WebsocketCommunicator(application, f'/ws/chat/{self.chatroom.id}/?token={token.key}')
+        communicator.scope['url_route'] = {'kwargs': {'chatroom_id': str(self.chatroom.id)}}
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        frame = await communicator.receive_json_from(timeout=2)
+        self.assertEqual(frame['user_id'], self.user.id)
+        await communicator.disconnect()
+
+        communicator = WebsocketCommunicator(application, f'/ws/chat/{self.chatroom.id}/?token=invalid')
+        communicator.scope['url_route'] = {'kwargs': {'chatroom_id': str(self.chatroom.id)}}
+        connected, _ = await communicator.connect()
+        self.assertFalse(connected)
+
+    @override_settings(CHAT_BATCH_WINDOW_MS=1000, CHAT_BATCH_MAX_MESSAGES=3)
+    async def test_bursts_are_coalesced_into_one_frame(self):
+        communicator = await self.connect()
+        channel_layer = get_channel_layer()
+        for i in range(3):
+            await channel_layer.group_send(f'chat_{self.chatroom.id}', {
+                'type': 'chat.message',
+                'message': {'id': i, 'text': f'burst {i}'},
+            })
+
+        frame = await communicator.receive_json_from(timeout=2)
+        self.assertEqual([m['text'] for m in frame['messages']], ['burst 0', 'burst 1', 'burst 2'])
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+
+
+class MessageIngestionQueueTestCase(TransactionTestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="testuser", password="testpassword")
+        self.chatroom = ChatRoom.objects.create(name='Test Chatroom', max_members=20)
+        self.chatroom.members.add(self.user)
+
+    def test_batched_messages_keep_submission_order(self):
+        queue = MessageIngestionQueue(batch_size=4, flush_interval=0.05)
+        self.addCleanup(queue.stop)
+
+        futures = [queue.submit(self.chatroom, self.user, f'message {i}') for i in range(10)]
+        messages = [future.result(timeout=5) for future in futures]
+
+        ids = [message.id for message in messages]
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(
+            list(Message.objects.filter(chatroom=self.chatroom).order_by('id').values_list('text', flat=True)),
+            [f'message {i}' for i in range(10)],
+        )
+
+    def test_writer_drops_stale_connections_before_each_batch(self):
+        queue = MessageIngestionQueue(batch_size=4, flush_interval=0.01)
+        self.addCleanup(queue.stop)
+
+        with mock.patch('chats.service.ingestion.close_old_connections') as close_old_connections:
+            queue.submit(self.chatroom, self.user, 'first').result(timeout=5)
+            queue.submit(self.chatroom, self.user, 'second').result(timeout=5)
+        self.assertEqual(close_old_connections.call_count, 2)
+
+    def stall_writer(self):
+        """
+        Make the writer block in its next batch until the returned event is set.
+        """
+        started = threading.Event()
+        release = threading.Event()
+        create_messages = MessageRepository.create_messages
+
+        def stalled(repository, messages):
+            started.set()
+            release.wait(5)
+            return create_messages(repository, messages)
+
+        patcher = mock.patch.object(MessageRepository, 'create_messages', stalled)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(release.set)
+        return started, release
+
+    @override_settings(CHAT_MESSAGE_INGESTION='queued', CHAT_INGESTION_TIMEOUT_MS=50)
+    def test_send_message_gives_up_on_stalled_writer(self):
+        queue = get_ingestion_queue()
+        self.addCleanup(queue.stop)
+        started, release = self.stall_writer()
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+
+        blocker = queue.submit(self.chatroom, self.user, 'Blocker')
+        self.assertTrue(started.wait(5))
+        url = reverse('message-list-create', kwargs={'chatroom_id': self.chatroom.id})
+        response = client.post(url, {'text': 'Stalled', 'chatroom': self.chatroom.id})
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        release.set()
+        blocker.result(timeout=5)
+        queue.stop()
+        self.assertFalse(Message.objects.filter(text='Stalled').exists())
+
+    def test_full_queue_holds_back_producers(self):
+        queue = MessageIngestionQueue(batch_size=1, flush_interval=0, max_pending=1)
+        self.addCleanup(queue.stop)
+        started, release = self.stall_writer()
+
+        futures = [queue.submit(self.chatroom, self.user, 'first')]
+        self.assertTrue(started.wait(5))
+        futures.append(queue.submit(self.chatroom, self.user, 'second'))
+        futures.append(queue.submit(self.chatroom, self.user, 'third'))
+        time.sleep(0.05)
+        self.assertEqual(queue.queue.qsize(), 1)
+
+        release.set()
+        self.assertEqual([future.result(timeout=5).text for future in futures], ['first', 'second', 'third'])
+
+    @override_settings(CHAT_MESSAGE_INGESTION='queued')
+    def test_send_message_through_queue(self):
+        self.addCleanup(get_ingestion_queue().stop)
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+
+        url = reverse('message-list-create', kwargs={'chatroom_id': self.chatroom.id})
+        response = client.post(url, {'text': 'Queued hello', 'chatroom': self.chatroom.id})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(Message.objects.filter(chatroom=self.chatroom, text='Queued hello').exists())
+
+
+class TokenAuthenticationTestCase(TestCase):
+    def setUp(self):
+        get_token_cache().clear()
+        self.user = get_user_model().objects.create_user(username="testuser", password="testpassword")
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_token_lookups_are_cached(self):
+        self.client.get('/api/chatrooms/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/chatrooms/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_logout_revokes_cached_token(self):
+        self.assertEqual(self.client.get('/api/chatrooms/').status_code, 200)
+        self.assertEqual(self.client.post(reverse('logout')).status_code, 204)
+        self.assertEqual(self.client.get('/api/chatrooms/').status_code, 401)
+
+    def test_deactivated_user_is_rejected(self):
+        self.assertEqual(self.client.get('/api/chatrooms/').status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/chatrooms/').status_code, 401)
+
+
+class MetricsTestCase(TestCase):
+    def setUp(self):
+        get_metrics().reset()
+        self.user = get_user_model().objects.create_user(username="testuser", password="testpassword", is_staff=True)
+        self.chatroom = ChatRoom.objects.create(name='Test Chatroom', max_members=20)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_views_are_timed_per_method(self):
+        url = reverse('message-list-create', kwargs={'chatroom_id': self.chatroom.id})
+        self.client.get(url)
+        self.client.get(url)
+        self.client.post(url, {'chatroom': self.chatroom.id, 'text': 'Hello'})
+
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        handlers = response.json()['handlers']
+        self.assertEqual(handlers['MessageListCreateView GET']['latency_ms']['count'], 2)
+        self.assertEqual(handlers['MessageListCreateView POST']['latency_ms']['count'], 1)
+        self.assertGreaterEqual(handlers['MessageListCreateView POST']['queries'], 1)
+        self.assertIn('room', response.json()['cache'])
+
+        self.assertEqual(self.client.delete(reverse('metrics')).status_code, 204)
+        self.assertNotIn('MessageListCreateView GET', get_metrics().snapshot())
+
+    def test_metrics_are_staff_only(self):
+        self.user.is_staff = False
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+
+    def test_latency_histogram_percentiles(self):
+        histogram = LatencyHistogram(buckets=(10, 100))
+        for value in [5] * 90 + [50] * 9 + [500]:
+            histogram.observe(value)
+        snapshot = histogram.snapshot()
+        self.assertLessEqual(snapshot['p50'], 10)
+        self.assertTrue(10 < snapshot['p95'] <= 100)
+        self.assertEqual(snapshot['max'], 500)
+        self.assertEqual(snapshot['buckets'], {'10': 90, '100': 9, '+Inf': 1})
+
+
+class ChatCacheTestCase(TestCase):
+    def setUp(self):
+        self.cache = get_chat_cache()
+        self.cache.clear()
+        self.cache.stats.reset()
+        self.user = get_user_model().objects.create_user(username="testuser", password="testpassword")
+        self.chatroom = ChatRoom.objects.create(name='Test Chatroom', max_members=20)
+
+    def test_chatroom_lookups_are_cached(self):
+        ChatService().get_chatroom(self.chatroom.id)
+        with self.assertNumQueries(0):
+            chatroom = ChatService().get_chatroom(self.chatroom.id)
+        self.assertEqual(chatroom.name, 'Test Chatroom')
+        self.assertEqual(self.cache.stats.snapshot()['room'], {'hits': 1, 'misses': 1, 'hit_ratio': 0.5})
+
+    def test_join_and_leave_invalidate_membership(self):
+        self.assertFalse(ChatService().is_member(self.user, self.chatroom.id))
+        self.assertEqual(ChatService().get_user_chatrooms(self.user), [])
+
+        ChatService().join_chatroom(self.user, self.chatroom)
+        self.assertTrue(ChatService().is_member(self.user, self.chatroom.id))
+        self.assertEqual(ChatService().get_user_chatrooms(self.user), [self.chatroom])
+
+        ChatService().leave_chatroom(self.user, self.chatroom)
+        self.assertFalse(ChatService().is_member(self.user, self.chatroom.id))
+        self.assertEqual(ChatService().get_user_chatrooms(self.user), [])
+
+    def test_direct_changes_invalidate_cache(self):
+        self.assertFalse(ChatService().is_member(self.user, self.chatroom.id))
+        self.chatroom.members.add(self.user)
+        self.assertTrue(ChatService().is_member(self.user, self.chatroom.id))
+        self.user.chat_rooms.clear()
+        self.assertFalse(ChatService().is_member(self.user, self.chatroom.id))
+
+    def test_shared_backend_sees_changes_made_by_other_processes(self):
+        config = {'BACKEND': 'chats.repository.cache.DjangoCacheBackend', 'OPTIONS': {'key_prefix': 'test-chats'}}
+        worker, other_worker = build_chat_cache(config), build_chat_cache(config)
+        worker.clear()
+
+        with mock.patch('chats.repository.cache._chat_cache', worker):
+            self.assertFalse(ChatService().is_member(self.user, self.chatroom.id))
+        with mock.patch('chats.repository.cache._chat_cache', other_worker):
+            ChatService().join_chatroom(self.user, self.chatroom)
+        with mock.patch('chats.repository.cache._chat_cache', worker):
+            self.assertTrue(ChatService().is_member(self.user, self.chatroom.id))
+
+        self.chatroom.name = 'Renamed'
+        self.chatroom.save()
+        self.assertEqual(ChatService().get_chatroom(self.chatroom.id).name, 'Renamed')
+        self.assertEqual([room['name'] for room in ChatService().get_chatrooms()], ['Renamed'])
+
+        self.chatroom.members.add(self.user)
+        self.assertEqual(ChatService().get_user_chatrooms(self.user), [self.chatroom])
+        chatroom_id = self.chatroom.id
+        self.chatroom.delete()
+        with self.assertRaises(ChatRoom.DoesNotExist):
+            ChatService().get_chatroom(chatroom_id)
+        self.assertEqual(ChatService().get_chatrooms(), [])
+        self.assertEqual(ChatService().get_user_chatrooms(self.user), [])
+        self.assertFalse(ChatService().is_member(self.user, chatroom_id))
+
+    def test_local_lru_cache_evicts_and_expires(self):
+        backend = LocalLRUCache(max_entries=2, timeout=60)
+        backend.set('a', 1)
+        backend.set('b', 2)
+        backend.get('a')
+        backend.set('c', 3)
+        self.assertIs(backend.get('b'), MISSING)
+        self.assertEqual(backend.get('a'), 1)
+
+        backend = LocalLRUCache(timeout=0)
+        backend.set('a', 1)
+        self.assertIs(backend.get('a'), MISSING)
+
+    def test_django_cache_backend_clears_only_its_prefix(self):
+        from django.core.cache import caches
+        caches['default'].set('unrelated', 1)
+        tokens = DjangoCacheBackend(key_prefix='test-tokens')
+        rooms = DjangoCacheBackend(key_prefix='test-rooms')
+        tokens.set('a', 1)
+        rooms.set('a', 2)
+
+        tokens.clear()
+        self.assertIs(tokens.get('a'), MISSING)
+        self.assertEqual(rooms.get('a'), 2)
+        self.assertEqual(caches['default'].get('unrelated'), 1)
+        tokens.set('a', 3)
+        self.assertEqual(tokens.get('a'), 3)
+
+
+class AttachmentUploadTestCase(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root, CHAT_UPLOAD_TEMP_DIR=os.path.join(media_root, 'partial'))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = get_user_model().objects.create_user(username="testuser", password="testpassword")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.chatroom = ChatRoom.objects.create(name='Test Chatroom', max_members=20)
+        self.message = Message.objects.create(chatroom=self.chatroom, sender=self.user, text='photo')
+        self.png = (
+            b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR' + struct.pack('>II', 40, 30) + b'\x08\x02\x00\x00\x00'
+            + b'\x00' * 1000
+        )
+
+    def put_chunk(self, upload_id, data, start):
+        return self.client.generic(
+            'PUT', reverse('attachment-upload', kwargs={'upload_id': upload_id}), data,
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{start + len(data) - 1}/{len(self.png)}',
+        )
+
+    def test_chunked_upload_creates_sniffed_attachment(self):
+        response = self.client.post(reverse('attachment-upload-create'), {
+            'message': self.message.id, 'filename': 'photo.png', 'size': len(self.png),
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        upload_id = response.json()['id']
+
+        response = self.put_chunk(upload_id, self.png[:600], 0)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['offset'], 600)
+
+        # Resending an old chunk is rejected; the upload resumes from its offset.
+        self.assertEqual(self.put_chunk(upload_id, self.png[:600], 0).status_code, status.HTTP_400_BAD_REQUEST)
+        offset = self.client.get(reverse('attachment-upload', kwargs={'upload_id': upload_id})).json()['offset']
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            response = self.put_chunk(upload_id, self.png[offset:], offset)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(callbacks), 1)
+        # The partial file is moved into storage, not copied.
+        self.assertFalse(os.listdir(AttachmentService().get_upload_dir()))
+
+        attachment = Attachment.objects.get(pk=response.json()['attachment'])
+        self.assertEqual(attachment.content_type, 'image/png')
+        self.assertIn('attachments/pictures', attachment.file.name)
+        with attachment.file.open('rb') as f:
+            self.assertEqual(f.read(), self.png)
+
+        attachment = process_attachment(attachment.pk)
+        self.assertEqual(attachment.processing_status, Attachment.PROCESSING_DONE)
+        self.assertEqual(attachment.metadata, {'width': 40, 'height': 30})
+        self.assertEqual(attachment.size, len(self.png))
+
+    def test_uploads_require_an_authorized_uploader(self):
+        url = reverse('attachment-upload-create')
+        data = {'message': self.message.id, 'filename': 'photo.png', 'size': len(self.png)}
+        upload_id = self.client.post(url, data).json()['id']
+
+        anonymous = APIClient()
+        self.assertEqual(anonymous.post(url, data).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(
+            anonymous.get(reverse('attachment-upload', kwargs={'upload_id': upload_id})).status_code,
+            status.HTTP_401_UNAUTHORIZED,
+        )
+
+        outsider = get_user_model().objects.create_user(username="outsider", password="testpassword")
+        self.client.force_authenticate(user=outsider)
+        self.assertEqual(self.client.post(url, data).status_code, status.HTTP_403_FORBIDDEN)
+        self.chatroom.members.add(outsider)
+        self.assertEqual(self.client.post(url, data).status_code, status.HTTP_201_CREATED)
+
+    def test_content_range_total_must_match_declared_size(self):
+        upload_id = self.client.post(reverse('attachment-upload-create'), {
+            'message': self.message.id, 'filename': 'photo.png', 'size': len(self.png),
+        }).json()['id']
+        response = self.client.generic(
+            'PUT', reverse('attachment-upload', kwargs={'upload_id': upload_id}), self.png[:100],
+            content_type='application/octet-stream', HTTP_CONTENT_RANGE=f'bytes 0-99/{len(self.png) + 1}',
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_abandoned_uploads_are_cleaned(self):
+        upload_id = self.client.post(reverse('attachment-upload-create'), {
+            'message': self.message.id, 'filename': 'photo.png', 'size': len(self.png),
+        }).json()['id']
+        self.put_chunk(upload_id, self.png[:600], 0)
+        upload = AttachmentUpload.objects.get(pk=upload_id)
+        path = AttachmentService().get_partial_path(upload)
+        orphan = os.path.join(os.path.dirname(path), 'orphan.part')
+        open(orphan, 'wb').close()
+        self.assertTrue(os.path.exists(path))
+
+        call_command('clean_attachment_uploads', stdout=StringIO())
+        self.assertTrue(os.path.exists(path))
+        self.assertTrue(os.path.exists(orphan))
+
+        AttachmentUpload.objects.filter(pk=upload_id).update(created_at=timezone.now() - timedelta(days=2))
+        os.utime(orphan, (0, 0))
+        call_command('clean_attachment_uploads', stdout=StringIO())
+        self.assertFalse(AttachmentUpload.objects.filter(pk=upload_id).exists())
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(os.path.exists(orphan))
+
+    def test_sniff_content_type(self):
+        self.assertEqual(sniff_content_type(self.png), 'image/png')
+        self.assertEqual(sniff_content_type(b'\x00\x00\x00\x18ftypmp42'), 'video/mp4')
+        self.assertEqual(sniff_content_type(b'plain text'), 'application/octet-stream')
+
+
+class SlowStream:
+    """
+    Request body that blocks on its first read until resume is set.
+    """
+    def __init__(self, data):
+        self.data = io.BytesIO(data)
+        self.reading = threading.Event()
+        self.resume = threading.Event()
+        self.in_transaction = None
+
+    def read(self, size):
+        if not self.reading.is_set():
+            self.in_transaction = connection.in_atomic_block
+            self.reading.set()
+            self.resume.wait(5)
+        return self.data.read(size)
+
+
+class AttachmentUploadConcurrencyTestCase(TransactionTestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root, CHAT_UPLOAD_TEMP_DIR=os.path.join(media_root, 'partial'))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = get_user_model().objects.create_user(username="testuser", password="testpassword")
+        self.chatroom = ChatRoom.objects.create(name='Test Chatroom', max_members=20)
+        self.message = Message.objects.create(chatroom=self.chatroom, sender=self.user, text='photo')
+        self.data = b'\x89PNG\r\n\x1a\n' + b'\x00' * 1000
+
+    def test_slow_chunk_does_not_block_other_writers(self):
+        upload = AttachmentService().start_upload(self.message, self.user, 'photo.png', len(self.data))
+        stream = SlowStream(self.data)
+        results = []
+
+        def append():
+            try:
+                results.append(AttachmentService().append_chunk(upload.pk, self.user, 0, len(self.data), stream))
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=append)
+        thread.start()
+        self.addCleanup(thread.join, 5)
+        self.addCleanup(stream.resume.set)
+        self.assertTrue(stream.reading.wait(5))
+
+        Message.objects.create(chatroom=self.chatroom, sender=self.user, text='sent during the upload')
+        stream.resume.set()
+        thread.join(5)
+
+        self.assertFalse(stream.in_transaction)
+        self.assertIsNotNone(results[0].attachment_id)
+        with results[0].attachment.file.open('rb') as f:
+            self.assertEqual(f.read(), self.data)
+
+
+class MessageSearchTestCase(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="testuser", password="testpassword")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.chatroom = ChatRoom.objects.create(name='Test Chatroom', max_members=20)
+        self.other_chatroom = ChatRoom.objects.create(name='Other Chatroom', max_members=20)
+        self.chatroom.members.add(self.user)
+
+    def search(self, query, **params):
+        url = reverse('message-search', kwargs={'chatroom_id': self.chatroom.id})
+        return self.client.get(url, {'q': query, **params})
+
+    def test_search_is_ranked_and_scoped_to_chatroom(self):
+        Message.objects.create(chatroom=self.chatroom, sender=self.user, text='pictures from the holiday by the beach')
+        Message.objects.create(chatroom=self.chatroom, sender=self.user, text='holiday holiday holiday!')
+        Message.objects.create(chatroom=self.chatroom, sender=self.user, text='see you at work')
+        Message.objects.create(chatroom=self.other_chatroom, sender=self.user, text='holiday plans')
+
+        response = self.search('Holiday')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [m['text'] for m in response.json()['results']],
+            ['holiday holiday holiday!', 'pictures from the holiday by the beach'],
+        )
+        self.assertEqual([m['text'] for m in self.search('pict* beach').json()['results']], ['pictures from the holiday by the beach'])
+
+    def test_search_index_follows_edits_and_deletes(self):
+        message = Message.objects.create(chatroom=self.chatroom, sender=self.user, text='draft')
+        message.text = 'final version'
+        message.save()
+        self.assertEqual(self.search('draft').json()['results'], [])
+        self.assertEqual(len(self.search('final').json()['results']), 1)
+
+        message.delete()
+        self.assertEqual(self.search('final').json()['results'], [])
+
+    def test_search_paginates_and_ignores_query_syntax(self):
+        for i in range(3):
+            Message.objects.create(chatroom=self.chatroom, sender=self.user, text=f'report {i}')
+
+        page = self.search('report', page_size=2).json()
+        self.assertEqual(len(page['results']), 2)
+        page = self.client.get(page['next']).json()
+        self.assertEqual(len(page['results']), 1)
+        self.assertIsNone(page['next'])
+
+        self.assertEqual(self.search('report" OR (NEAR').status_code, 200)
+        self.assertEqual(self.search('').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_rebuild_search_index_command(self):
+        Message.objects.create(chatroom=self.chatroom, sender=self.user, text='indexed before rebuild')
+        call_command('rebuild_message_search_index', stdout=StringIO())
+        self.assertEqual(len(self.search('rebuild').json()['results']), 1)
+
+    def test_search_is_for_members_only(self):
+        Message.objects.create(chatroom=self.other_chatroom, sender=self.user, text='secret plans')
+        url = reverse('message-search', kwargs={'chatroom_id': self.other_chatroom.id})
+        self.assertEqual(self.client.get(url, {'q': 'secret'}).status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(APIClient().get(url, {'q': 'secret'}).status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class MessageSearchMigrationTestCase(TransactionTestCase):
+    def test_migration_rebuilding_message_table_keeps_search_working(self):
+        user = get_user_model().objects.create_user(username="testuser", password="testpassword")
+        chatroom = ChatRoom.objects.create(name='Test Chatroom', max_members=20)
+        Message.objects.create(chatroom=chatroom, sender=user, text='written before the migration')
+
+        # Altering a column makes SQLite copy chats_message into a new table.
+        executor = MigrationExecutor(connection)
+        leaf = executor.loader.graph.leaf_nodes('chats')[0]
+        migration = migrations.Migration('9999_nullable_message_text', 'chats')
+        migration.dependencies = [leaf]
+        migration.operations = [migrations.AlterField('message', 'text', models.TextField(null=True))]
+        executor.apply_migration(executor.loader.project_state(leaf), migration)
+        self.addCleanup(search.restore_search_triggers, connection)
+        self.addCleanup(executor.unapply_migration, executor.loader.project_state(leaf), migration)
+
+        Message.objects.create(chatroom=chatroom, sender=user, text='written while the triggers were gone')
+        emit_post_migrate_signal(0, False, connection.alias)
+        Message.objects.create(chatroom=chatroom, sender=user, text='written after the migration')
+
+        self.assertEqual(len(search.search_message_ids(chatroom.id, 'written', limit=10)), 3)
+
+
+def shared_layer_worker(path, user_id, ready, received):
+    """
+    Stand-in for a server process: joins chat_1 on the shared layer, marks
+    itself online and reports the first message it receives.
+    """
+    async def run():
+        layer = SQLiteChannelLayer(path=path)
+        channel_name = await layer.new_channel()
+        await layer.group_add('chat_1', channel_name)
+        SQLitePresence(path=path).join(1, channel_name, user_id)
+        ready.put(user_id)
+        message = await layer.receive(channel_name)
+        received.put((user_id, message['text']))
+        SQLitePresence(path=path).leave(1, channel_name)
+
+    asyncio.run(run())
+
+
+class SharedChannelLayerTestCase(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'channels.sqlite3')
+
+    def test_group_send_reaches_every_worker_process(self):
+        context = multiprocessing.get_context('fork')
+        ready, received = context.Queue(), context.Queue()
+        workers = [context.Process(target=shared_layer_worker, args=(self.path, user_id, ready, received)) for user_id in (1, 2, 3)]
+        for worker in workers:
+            worker.start()
+        self.addCleanup(lambda: [worker.kill() for worker in workers if worker.is_alive()])
+
+        self.assertEqual(sorted(ready.get(timeout=10) for _ in workers), [1, 2, 3])
+        presence = SQLitePresence(path=self.path)
+        self.assertEqual(presence.count(1), 3)
+        self.assertEqual(presence.online(1), [1, 2, 3])
+
+        async_to_sync(SQLiteChannelLayer(path=self.path).group_send)('chat_1', {'type': 'chat.message', 'text': 'hello nodes'})
+        self.assertEqual(sorted(received.get(timeout=10) for _ in workers), [(1, 'hello nodes'), (2, 'hello nodes'), (3, 'hello nodes')])
+        for worker in workers:
+            worker.join(timeout=10)
+        self.assertEqual(presence.count(1), 0)
+
+    def test_idle_receive_does_not_need_the_write_lock(self):
+        layer = SQLiteChannelLayer(path=self.path)
+        channel_name = async_to_sync(layer.new_channel)()
+        self.assertIsNone(layer._pop(channel_name))
+        blocker = sqlite3.connect(self.path, timeout=0, isolation_level=None)
+        self.addCleanup(blocker.close)
+        blocker.execute('BEGIN IMMEDIATE')
+        try:
+            start = time.monotonic()
+            self.assertIsNone(layer._pop(channel_name))
+            self.assertLess(time.monotonic() - start, 1)
+        finally:
+            blocker.execute('ROLLBACK')
+
+        async_to_sync(layer.send)(channel_name, {'type': 'chat.message', 'text': 'hello'})
+        self.assertEqual(async_to_sync(layer.receive)(channel_name)['text'], 'hello')
+
+    def test_dead_channels_are_purged(self):
+        layer = SQLiteChannelLayer(path=self.path, expiry=0.05, purge_interval=0)
+        live, dead = async_to_sync(layer.new_channel)(), async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)('chat_1', live)
+        async_to_sync(layer.group_add)('chat_1', dead)
+        async_to_sync(layer.group_send)('chat_1', {'type': 'chat.message', 'text': 'first'})
+        async_to_sync(layer.receive)(live)
+        time.sleep(0.1)
+
+        # The next write purges the message nobody received and its channel.
+        async_to_sync(layer.group_send)('chat_1', {'type': 'chat.message', 'text': 'second'})
+        connection = layer.connections.get()
+        self.assertEqual(
+            connection.execute('SELECT channel FROM channel_groups').fetchall(), [(live,)],
+        )
+        self.assertEqual(
+            connection.execute('SELECT channel FROM channel_messages').fetchall(), [(live,)],
+        )
+
+    def test_heartbeat_revives_expired_connection(self):
+        for presence in (LocalPresence(ttl=0.05), SQLitePresence(path=self.path, ttl=0.05)):
+            with self.subTest(presence=type(presence).__name__):
+                self.assertTrue(presence.join(1, 'a', 10))
+                time.sleep(0.1)
+                self.assertEqual(presence.count(1), 0)
+                self.assertEqual(presence.expire(1), [10])
+                self.assertEqual(presence.expire(1), [])
+
+                presence.ttl = 60
+                self.assertTrue(presence.heartbeat(1, 'a', 10))
+                self.assertFalse(presence.heartbeat(1, 'a', 10))
+                self.assertEqual(presence.online(1), [10])
+                self.assertTrue(presence.leave(1, 'a'))
+
+    def test_local_presence_expires_without_heartbeat(self):
+        presence = LocalPresence(ttl=60)
+        self.assertTrue(presence.join(1, 'a', 10))
+        self.assertFalse(presence.join(1, 'b', 10))
+        self.assertEqual(presence.count(1), 1)
+        self.assertFalse(presence.leave(1, 'a'))
+        self.assertTrue(presence.leave(1, 'b'))
+
+        presence = LocalPresence(ttl=0)
+        presence.join(1, 'a', 10)
+        self.assertEqual(presence.count(1), 0)
+
+
+@skipUnless(os.environ.get('CHAT_TEST_REDIS_URL'), 'set CHAT_TEST_REDIS_URL to test against a Redis server')
+class RedisPresenceTestCase(SimpleTestCase):
+    def setUp(self):
+        self.prefix = f'chats-test:{uuid.uuid4().hex}'
+
+    def tearDown(self):
+        client = self.get_presence().client
+        for key in client.scan_iter(f'{self.prefix}:*'):
+            client.delete(key)
+
+    def get_presence(self, ttl=60):
+        return RedisPresence(url=os.environ['CHAT_TEST_REDIS_URL'], ttl=ttl, prefix=self.prefix)
+
+    def test_nodes_share_connections(self):
+        node, other_node = self.get_presence(), self.get_presence()
+        self.assertTrue(node.join(1, 'a', 10))
+        self.assertFalse(other_node.join(1, 'b', 10))
+        self.assertEqual(node.online(1), [10])
+        self.assertEqual(other_node.count(1), 1)
+
+        self.assertFalse(node.leave(1, 'a'))
+        self.assertEqual(node.online(1), [10])
+        self.assertTrue(other_node.leave(1, 'b'))
+        self.assertEqual(node.online(1), [])
+
+    def test_heartbeat_revives_expired_connection(self):
+        presence = self.get_presence(ttl=0.05)
+        self.assertTrue(presence.join(1, 'a', 10))
+        time.sleep(0.1)
+        self.assertEqual(presence.count(1), 0)
+        self.assertEqual(presence.expire(1), [10])
+        self.assertEqual(presence.expire(1), [])
+
+        presence.ttl = 60
+        self.assertTrue(presence.heartbeat(1, 'a', 10))
+        self.assertFalse(presence.heartbeat(1, 'a', 10))
+        self.assertEqual(presence.online(1), [10])
+        self.assertTrue(presence.leave(1, 'a'))
@@ -0,0 +1,16 @@
+from django.urls import path
+from chats.controller.controllers import ChatRoomListCreateView, ChatRoomPresenceView, MessageListCreateView, MessageSearchView, AttachmentCreateView, AttachmentUploadCreateView, AttachmentUploadView, MetricsView, LoginView, LogoutView, CreateUserView
+
+urlpatterns = [
+    path('chatrooms/', ChatRoomListCreateView.as_view(), name='chatroom-list-create'),
+    path('chatrooms/<int:chatroom_id>/presence/', ChatRoomPresenceView.as_view(), name='chatroom-presence'),
+    path('messages/<int:chatroom_id>/', MessageListCreateView.as_view(), name='message-list-create'),
+    path('messages/<int:chatroom_id>/search/', MessageSearchView.as_view(), name='message-search'),
+    path('attachments/', AttachmentCreateView.as_view(), name='attachment-create'),
+    path('attachments/uploads/', AttachmentUploadCreateView.as_view(), name='attachment-upload-create'),
+    path('attachments/uploads/<uuid:upload_id>/', AttachmentUploadView.as_view(), name='attachment-upload'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+    path('login/', LoginView.as_view(), name='login'),
+    path('logout/', LogoutView.as_view(), name='logout'),
+    path('createuser/', CreateUserView.as_view(), name='create-user'),
+]
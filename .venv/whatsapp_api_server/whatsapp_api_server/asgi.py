@@ -0,0 +1,24 @@
+"""
+ASGI config for whatsapp_api_server project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
+"""
+
+import os
+from django.core.asgi import get_asgi_application
+from channels.routing import ProtocolTypeRouter, URLRouter
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'whatsapp_api_server.settings')
+
+# Set up Django before the websocket routing imports any models.
+http_application = get_asgi_application()
+
+from .routing import application as chat_application  # noqa: E402
+
+application = ProtocolTypeRouter({
+    "http": http_application,
+    "websocket": chat_application,
+})
\ No newline at end of file
@@ -0,0 +1,17 @@
+# asgi.py or routing.py (project level)
+from channels.routing import ProtocolTypeRouter, URLRouter
+from django.urls import path
+from chats.authentication import TokenAuthMiddlewareStack
+from chats.consumer import ChatConsumer
+from chats.routing import websocket_urlpatterns 
+
+application = ProtocolTypeRouter({
+    "websocket": TokenAuthMiddlewareStack(
+        URLRouter(
+            [
+                path("ws/chat/", ChatConsumer.as_asgi()),
+            ] +
+            websocket_urlpatterns  
+        )
+    ),
+})
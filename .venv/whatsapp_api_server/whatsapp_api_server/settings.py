@@ -0,0 +1,283 @@
+"""
+Django settings for whatsapp_api_server project.
+
+Generated by 'django-admin startproject' using Django 4.2.7.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/4.2/topics/settings/
+
+For the full list of settings and their values, see
+https://docs.djangoproject.com/en/4.2/ref/settings/
+"""
+
+import os
+from pathlib import Path
+
+# Build paths inside the project like this: BASE_DIR / 'subdir'.
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+# Quick-start development settings - unsuitable for production
+# See https://docs.djangoproject.com/en/4.2/howto/deployment/checklist/
+
+# SECURITY WARNING: keep the secret key used in production secret!
+SECRET_KEY = 'django-insecure-b(6plnh-!r05g4)^4y=iic*mev)g88zn+r-in&t+9_kdk@1d64'
+
+# SECURITY WARNING: don't run with debug turned on in production!
+DEBUG = True
+
+ALLOWED_HOSTS = []
+
+
+# Application definition
+
+INSTALLED_APPS = [
+    'django.contrib.admin',
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+    'channels',
+    'rest_framework',
+    'rest_framework.authtoken',
+    'drf_yasg',
+    'chats',
+]
+
+MIDDLEWARE = [
+    'chats.metrics.RequestMetricsMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+
+
+]
+
+ROOT_URLCONF = 'whatsapp_api_server.urls'
+
+#Channels Configuration
+ASGI_APPLICATION = "whatsapp_api_server.asgi.application"
+
+# Channel layer and presence tracking. The in-memory layer only delivers
+# within one process. To run several server processes, point them all at the
+# same Redis (CHAT_REDIS_URL, needs channels_redis), or, on a single machine,
+# at the same SQLite file (CHAT_CHANNEL_LAYER_PATH); presence is then tracked
+# in the same place, so every process sees every connection. Presence
+# heartbeats expire after CHAT_PRESENCE_TTL seconds.
+CHAT_PRESENCE_TTL = 60
+
+if os.environ.get('CHAT_REDIS_URL'):
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {'hosts': [os.environ['CHAT_REDIS_URL']]},
+        },
+    }
+elif os.environ.get('CHAT_CHANNEL_LAYER_PATH'):
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'chats.layers.SQLiteChannelLayer',
+            'CONFIG': {'path': os.environ['CHAT_CHANNEL_LAYER_PATH']},
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        },
+    }
+
+if os.environ.get('CHAT_REDIS_URL'):
+    CHAT_PRESENCE = {
+        'BACKEND': 'chats.presence.RedisPresence',
+        'OPTIONS': {'url': os.environ['CHAT_REDIS_URL'], 'ttl': CHAT_PRESENCE_TTL},
+    }
+elif os.environ.get('CHAT_CHANNEL_LAYER_PATH'):
+    CHAT_PRESENCE = {
+        'BACKEND': 'chats.presence.SQLitePresence',
+        'OPTIONS': {'path': os.environ['CHAT_CHANNEL_LAYER_PATH'], 'ttl': CHAT_PRESENCE_TTL},
+    }
+else:
+    CHAT_PRESENCE = {
+        'BACKEND': 'chats.presence.LocalPresence',
+        'OPTIONS': {'ttl': CHAT_PRESENCE_TTL},
+    }
+
+# Websocket delivery batching: a consumer coalesces messages published to its
+# chat room and flushes them as one frame every CHAT_BATCH_WINDOW_MS, or as
+# soon as CHAT_BATCH_MAX_MESSAGES are pending. A window of 0 disables batching.
+CHAT_BATCH_WINDOW_MS = 50
+CHAT_BATCH_MAX_MESSAGES = 50
+
+# Message ingestion: 'direct' saves each message in its own transaction;
+# 'queued' hands it to an in-process queue whose writer inserts batches of up
+# to CHAT_INGESTION_BATCH_SIZE messages, waiting at most CHAT_INGESTION_FLUSH_MS
+# to fill a batch. Request threads wait at most CHAT_INGESTION_TIMEOUT_MS for
+# their message to be saved, and get a 503 (the message is dropped) after
+# that. At most CHAT_INGESTION_MAX_PENDING messages are queued; senders wait
+# for room beyond that.
+CHAT_MESSAGE_INGESTION = 'direct'
+CHAT_INGESTION_BATCH_SIZE = 100
+CHAT_INGESTION_FLUSH_MS = 10
+CHAT_INGESTION_TIMEOUT_MS = 5000
+CHAT_INGESTION_MAX_PENDING = 10000
+
+# Read-through caches for chat room metadata and memberships (CHAT_CACHE)
+# and for tokens and their users (CHAT_TOKEN_CACHE, with a shorter TTL).
+# Changes evict entries immediately, but LocalLRUCache only evicts within the
+# process that made the change: other processes would keep serving stale
+# memberships, and revoked tokens, for up to the TTL. So when a shared channel
+# layer is configured, both caches use a shared Django cache instead: Redis
+# with CHAT_REDIS_URL, or a file cache next to CHAT_CHANNEL_LAYER_PATH.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+if os.environ.get('CHAT_REDIS_URL'):
+    CACHES['chats'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['CHAT_REDIS_URL'],
+    }
+elif os.environ.get('CHAT_CHANNEL_LAYER_PATH'):
+    CACHES['chats'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ['CHAT_CHANNEL_LAYER_PATH'] + '-cache',
+    }
+
+if 'chats' in CACHES:
+    CHAT_CACHE = {
+        'BACKEND': 'chats.repository.cache.DjangoCacheBackend',
+        'OPTIONS': {
+            'alias': 'chats',
+            'timeout': 300,
+            'key_prefix': 'chats',
+        },
+    }
+    CHAT_TOKEN_CACHE = {
+        'BACKEND': 'chats.repository.cache.DjangoCacheBackend',
+        'OPTIONS': {
+            'alias': 'chats',
+            'timeout': 60,
+            'key_prefix': 'chats-token',
+        },
+    }
+else:
+    CHAT_CACHE = {
+        'BACKEND': 'chats.repository.cache.LocalLRUCache',
+        'OPTIONS': {
+            'max_entries': 10000,
+            'timeout': 300,
+        },
+    }
+    CHAT_TOKEN_CACHE = {
+        'BACKEND': 'chats.repository.cache.LocalLRUCache',
+        'OPTIONS': {
+            'max_entries': 10000,
+            'timeout': 60,
+        },
+    }
+
+# Chunked attachment uploads are assembled in CHAT_UPLOAD_TEMP_DIR; once
+# complete, CHAT_MEDIA_WORKERS background threads extract metadata and
+# thumbnails (thumbnails need Pillow, video metadata needs ffprobe).
+# Uploads still incomplete after CHAT_UPLOAD_EXPIRY_HOURS, and their partial
+# files, are removed by `manage.py clean_attachment_uploads`; run it from cron.
+CHAT_UPLOAD_TEMP_DIR = BASE_DIR / 'media' / 'partial_uploads'
+CHAT_MAX_UPLOAD_SIZE = 2 * 1024 ** 3
+CHAT_UPLOAD_EXPIRY_HOURS = 24
+CHAT_MEDIA_WORKERS = 2
+
+
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': [],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.debug',
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+            ],
+        },
+    },
+]
+
+WSGI_APPLICATION = 'whatsapp_api_server.wsgi.application'
+
+
+# Database
+# https://docs.djangoproject.com/en/4.2/ref/settings/#databases
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+    }
+}
+
+
+# Password validation
+# https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
+
+AUTH_PASSWORD_VALIDATORS = [
+    {
+        'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
+    },
+]
+
+
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'chats.authentication.CachedTokenAuthentication',
+        "rest_framework.authentication.SessionAuthentication",  # new
+        "rest_framework.authentication.BasicAuthentication",  # new
+
+
+    ],
+}
+
+# Internationalization
+# https://docs.djangoproject.com/en/4.2/topics/i18n/
+
+LANGUAGE_CODE = 'en-us'
+
+TIME_ZONE = 'UTC'
+
+USE_I18N = True
+
+USE_TZ = True
+
+
+# Static files (CSS, JavaScript, Images)
+# https://docs.djangoproject.com/en/4.2/howto/static-files/
+
+STATIC_URL = '/static/'
+STATIC_ROOT = BASE_DIR / 'static_root'
+STATICFILES_DIRS = [BASE_DIR / 'static']
+
+MEDIA_URL = '/media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
+
+# Default primary key field type
+# https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
+
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'